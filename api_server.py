@@ -4,15 +4,26 @@ PRODUCTION FASTAPI SERVER - M1 OPTIMIZED
 Complete API server for the M1 chatbot system
 """
 
-from fastapi import FastAPI, HTTPException, BackgroundTasks
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.gzip import GZipMiddleware
-from pydantic import BaseModel, Field
+from starlette.middleware import Middleware
+from fastapi.responses import ORJSONResponse, Response, StreamingResponse
+from starlette.concurrency import iterate_in_threadpool
+from pydantic import BaseModel, ConfigDict, Field, ValidationError
 from typing import List, Dict, Optional, Literal
+import anyio
+import asyncio
 import uvicorn
+import orjson
 import logging
+import os
+import threading
+from contextlib import asynccontextmanager
 from datetime import datetime
 import time
+from collections import Counter, OrderedDict, deque
+from functools import lru_cache
 import psutil
 from pathlib import Path
 
@@ -26,41 +37,109 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+class SelectiveGZipMiddleware:
+    """Apply gzip only to routes that return large bodies"""
+    
+    def __init__(self, app, paths, minimum_size: int = 500):
+        self.app = app
+        self.gzip_app = GZipMiddleware(app, minimum_size=minimum_size)
+        self.paths = frozenset(paths)
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"] in self.paths:
+            await self.gzip_app(scope, receive, send)
+        else:
+            await self.app(scope, receive, send)
+
+# Middleware (outermost first). Small responses and the SSE stream skip gzip
+# entirely; CORS can be disabled when a gateway already sets the headers.
+middleware = [
+    Middleware(SelectiveGZipMiddleware, paths=["/chat", "/chat/compare", "/sessions"], minimum_size=500)
+]
+if os.getenv("ENABLE_CORS", "true").lower() == "true":
+    middleware.append(Middleware(
+        CORSMiddleware,
+        allow_origins=["*"],
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    ))
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Size the threadpool and run the background samplers for the lifetime of the server"""
+    # Sync endpoints run on the AnyIO worker threadpool
+    anyio.to_thread.current_default_thread_limiter().total_tokens = THREADPOOL_SIZE
+    tasks = [asyncio.create_task(job()) for job in (sample_cpu_usage, tick_clock, flush_request_stats)]
+    yield
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
 # Initialize FastAPI
 app = FastAPI(
     title="M1 AI Chatbot API",
     description="Production-ready M1-optimized AI chatbot API with multiple personalities",
     version="1.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
-)
-
-# Add middleware
-app.add_middleware(GZipMiddleware, minimum_size=1000)
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+    redoc_url="/redoc",
+    default_response_class=ORJSONResponse,
+    middleware=middleware,
+    lifespan=lifespan
 )
 
 # Initialize chatbot system
-chatbot_system = M1ChatbotSystem()
+# Set MEMCACHED_SERVER (host:port) to share sessions and stats across workers
+MEMCACHED_SERVER = os.getenv("MEMCACHED_SERVER")
+if MEMCACHED_SERVER:
+    from session_store import MemcachedSessionStore, MemcachedRequestStats
+    chatbot_system = M1ChatbotSystem(
+        sessions=MemcachedSessionStore(MEMCACHED_SERVER, ttl=int(M1ChatbotSystem.SESSION_TIMEOUT.total_seconds()))
+    )
+    shared_request_stats = MemcachedRequestStats(MEMCACHED_SERVER)
+else:
+    chatbot_system = M1ChatbotSystem()
+    shared_request_stats = None
+PERSONALITY_IDS = ("technical_expert", "creative_partner", "business_advisor")
 
 # Performance tracking
-request_stats = {
-    "total_requests": 0,
-    "total_response_time": 0.0,
-    "error_count": 0
+# Handlers append (response_time, success) to a ring buffer (deque appends are
+# atomic), and a background task folds it into request_stats every flush interval.
+STATS_FLUSH_INTERVAL = 0.5
+request_events = deque(maxlen=8192)
+request_stats = Counter(total_requests=0, total_response_time=0.0, error_count=0)
+
+# System sampling (kept off the request path)
+CPU_SAMPLE_INTERVAL = 2.0
+MEMORY_CACHE_TTL = 1.0
+system_stats = {
+    "cpu_percent": 0.0,
+    "memory": None,
+    "memory_sampled_at": 0.0
 }
 
+# Cached wall clock for response timestamps, refreshed every CLOCK_TICK_INTERVAL
+CLOCK_TICK_INTERVAL = 0.25
+clock = {"now": datetime.now()}
+clock["now_json"] = orjson.dumps(clock["now"])
+
+# Accepted (session_id, request_nonce) pairs. Shared through Memcached when configured;
+# the local fallback keeps the most recent NONCE_CACHE_SIZE pairs
+NONCE_TTL = 300
+NONCE_CACHE_SIZE = 4096
+seen_nonces = OrderedDict()
+seen_nonces_lock = threading.Lock()
+
 # Pydantic models
 class ChatRequest(BaseModel):
+    model_config = ConfigDict(str_strip_whitespace=False, extra="ignore")
+    
     message: str = Field(..., min_length=1, max_length=4000)
     personality: Literal["technical_expert", "creative_partner", "business_advisor"] = "technical_expert"
     session_id: Optional[str] = None
     technique: Literal["standard", "chain_of_thought", "few_shot", "step_by_step", "socratic", "analogical"] = "standard"
+    # Set by the UI per submitted turn; a repeat of the same (session_id, request_nonce) is rejected
+    request_nonce: Optional[str] = Field(None, max_length=64, pattern=r"^[A-Za-z0-9_-]+$")
 
 class ChatResponse(BaseModel):
     response: str
@@ -71,6 +150,8 @@ class ChatResponse(BaseModel):
     timestamp: datetime
 
 class SessionRequest(BaseModel):
+    model_config = ConfigDict(str_strip_whitespace=False, extra="ignore")
+    
     personality: Literal["technical_expert", "creative_partner", "business_advisor"]
 
 class SessionResponse(BaseModel):
@@ -86,90 +167,186 @@ class SystemMetrics(BaseModel):
     avg_response_time: float
     uptime: str
 
+class SystemStatus(BaseModel):
+    healthy: bool
+    metrics: SystemMetrics
+
 class PersonalityInfo(BaseModel):
     id: str
     name: str
     description: str
     capabilities: List[str]
 
+# Blocking chatbot calls run in plain `def` endpoints, which FastAPI
+# dispatches to the AnyIO worker threadpool instead of the event loop.
+THREADPOOL_SIZE = int(os.getenv("API_THREADPOOL_SIZE", "64"))
+
+async def sample_cpu_usage():
+    """Refresh the cached CPU percentage in the background"""
+    psutil.cpu_percent(interval=None)  # Prime the measurement window
+    while True:
+        await asyncio.sleep(CPU_SAMPLE_INTERVAL)
+        system_stats["cpu_percent"] = psutil.cpu_percent(interval=None)
+
+async def tick_clock():
+    """Refresh the cached timestamp and its pre-encoded JSON form"""
+    while True:
+        now = datetime.now()
+        clock["now"], clock["now_json"] = now, orjson.dumps(now)
+        await asyncio.sleep(CLOCK_TICK_INTERVAL)
+
 # Helper functions
+def get_memory_snapshot():
+    """Get virtual memory stats, cached for MEMORY_CACHE_TTL seconds"""
+    now = time.monotonic()
+    if system_stats["memory"] is None or now - system_stats["memory_sampled_at"] > MEMORY_CACHE_TTL:
+        system_stats["memory"] = psutil.virtual_memory()
+        system_stats["memory_sampled_at"] = now
+    return system_stats["memory"]
+
+def claim_request_nonce(request: ChatRequest):
+    """Reject a chat turn whose (session_id, request_nonce) was already accepted"""
+    if request.request_nonce is None:
+        return
+    
+    if shared_request_stats is not None:
+        first = shared_request_stats.claim(f"nonce:{request.session_id}:{request.request_nonce}", NONCE_TTL)
+    else:
+        key = (request.session_id, request.request_nonce)
+        with seen_nonces_lock:
+            first = key not in seen_nonces
+            if first:
+                seen_nonces[key] = None
+                if len(seen_nonces) > NONCE_CACHE_SIZE:
+                    seen_nonces.popitem(last=False)
+    
+    if not first:
+        raise HTTPException(status_code=409, detail="Duplicate request")
+
 def track_request(response_time: float, success: bool = True):
     """Track request metrics"""
-    request_stats["total_requests"] += 1
-    request_stats["total_response_time"] += response_time
-    if not success:
-        request_stats["error_count"] += 1
+    request_events.append((response_time, success))
+
+def drain_request_events():
+    """Pop buffered request events and return (requests, total_time, errors)"""
+    requests = errors = 0
+    total_time = 0.0
+    while request_events:
+        response_time, success = request_events.popleft()
+        requests += 1
+        total_time += response_time
+        if not success:
+            errors += 1
+    return requests, total_time, errors
+
+async def flush_request_stats():
+    """Fold buffered request events into the aggregate counters"""
+    while True:
+        await asyncio.sleep(STATS_FLUSH_INTERVAL)
+        requests, total_time, errors = drain_request_events()
+        if not requests:
+            continue
+        if shared_request_stats is not None:
+            await anyio.to_thread.run_sync(shared_request_stats.record, requests, total_time, errors)
+        else:
+            request_stats["total_requests"] += requests
+            request_stats["total_response_time"] += total_time
+            request_stats["error_count"] += errors
+
+# Static payloads, serialized once at import
+ROOT_PAYLOAD = orjson.dumps({
+    "name": "M1 AI Chatbot API",
+    "version": "1.0.0",
+    "status": "operational",
+    "features": [
+        "M1 MacBook Pro optimized",
+        "Multiple AI personalities",
+        "Advanced prompt engineering",
+        "Session management",
+        "Real-time analytics"
+    ],
+    "documentation": "/docs"
+})
+
+# Everything but the timestamp is constant, so only that value is encoded per hit
+HEALTH_PAYLOAD_PREFIX = orjson.dumps({
+    "status": "healthy",
+    "system": "M1 MacBook Pro",
+    "version": "1.0.0"
+})[:-1] + b',"timestamp":'
 
 # API Endpoints
 @app.get("/")
 async def root():
     """API information"""
-    return {
-        "name": "M1 AI Chatbot API",
-        "version": "1.0.0",
-        "status": "operational",
-        "features": [
-            "M1 MacBook Pro optimized",
-            "Multiple AI personalities",
-            "Advanced prompt engineering",
-            "Session management",
-            "Real-time analytics"
-        ],
-        "documentation": "/docs"
-    }
+    return Response(content=ROOT_PAYLOAD, media_type="application/json")
 
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
-    return {
-        "status": "healthy",
-        "timestamp": datetime.now(),
-        "system": "M1 MacBook Pro",
-        "version": "1.0.0"
-    }
+    return Response(
+        content=HEALTH_PAYLOAD_PREFIX + clock["now_json"] + b"}",
+        media_type="application/json"
+    )
 
-@app.get("/metrics", response_model=SystemMetrics)
-async def get_metrics():
-    """Get system metrics"""
-    memory = psutil.virtual_memory()
-    cpu_percent = psutil.cpu_percent(interval=1)
+def build_metrics() -> Dict:
+    """Assemble the system metrics payload"""
+    memory = get_memory_snapshot()
+    cpu_percent = system_stats["cpu_percent"]
     
+    stats = shared_request_stats.snapshot() if shared_request_stats is not None else request_stats
+    total_requests = stats["total_requests"]
     avg_response_time = (
-        request_stats["total_response_time"] / request_stats["total_requests"]
-        if request_stats["total_requests"] > 0 else 0
+        stats["total_response_time"] / total_requests
+        if total_requests > 0 else 0
     )
     
-    return SystemMetrics(
-        cpu_usage=cpu_percent,
-        memory_usage={
+    return {
+        "cpu_usage": cpu_percent,
+        "memory_usage": {
             "total_gb": memory.total / (1024**3),
             "used_gb": memory.used / (1024**3),
             "available_gb": memory.available / (1024**3),
             "percent": memory.percent
         },
-        active_sessions=len(chatbot_system.sessions),
-        total_requests=request_stats["total_requests"],
-        avg_response_time=avg_response_time,
-        uptime="N/A"  # Could implement proper uptime tracking
-    )
+        "active_sessions": len(chatbot_system.sessions),
+        "total_requests": total_requests,
+        "avg_response_time": avg_response_time,
+        "uptime": "N/A"  # Could implement proper uptime tracking
+    }
 
-@app.get("/personalities", response_model=List[PersonalityInfo])
-async def get_personalities():
-    """Get available AI personalities"""
+@app.get("/metrics", responses={200: {"model": SystemMetrics}})
+def get_metrics():
+    """Get system metrics"""
+    return build_metrics()
+
+@app.get("/status", responses={200: {"model": SystemStatus}})
+def get_status():
+    """Health and metrics in one round-trip for dashboards"""
+    return {"healthy": True, "metrics": build_metrics()}
+
+@lru_cache(maxsize=1)
+def build_personalities_payload() -> bytes:
+    """Serialize the static personality list once"""
     personalities = []
     
     for personality_id, data in chatbot_system.personalities.items():
-        personalities.append(PersonalityInfo(
-            id=personality_id,
-            name=data["name"],
-            description=data["description"],
-            capabilities=list(data["responses"].keys())
-        ))
+        personalities.append({
+            "id": personality_id,
+            "name": data["name"],
+            "description": data["description"],
+            "capabilities": list(data["responses"].keys())
+        })
     
-    return personalities
+    return orjson.dumps(personalities)
+
+@app.get("/personalities", responses={200: {"model": List[PersonalityInfo]}})
+async def get_personalities():
+    """Get available AI personalities"""
+    return Response(content=build_personalities_payload(), media_type="application/json")
 
-@app.post("/sessions", response_model=SessionResponse)
-async def create_session(request: SessionRequest):
+@app.post("/sessions", responses={200: {"model": SessionResponse}})
+def create_session(request: SessionRequest):
     """Create new chat session"""
     try:
         session_id = chatbot_system.create_session(request.personality)
@@ -184,15 +361,14 @@ async def create_session(request: SessionRequest):
         logger.error(f"Session creation failed: {e}")
         raise HTTPException(status_code=500, detail=f"Session creation failed: {str(e)}")
 
-@app.post("/chat", response_model=ChatResponse)
-async def chat(
-    request: ChatRequest,
-    background_tasks: BackgroundTasks
-):
+@app.post("/chat", responses={200: {"model": ChatResponse}})
+def chat(request: ChatRequest):
     """Main chat endpoint"""
     start_time = time.time()
     
     try:
+        claim_request_nonce(request)
+        
         # Create session if not provided
         if not request.session_id:
             session_id = chatbot_system.create_session(request.personality)
@@ -201,110 +377,165 @@ async def chat(
             if session_id not in chatbot_system.sessions:
                 raise HTTPException(status_code=404, detail="Session not found")
         
-        # Generate response
-        result = chatbot_system.chat(
+        # Generate response, already serialized so FastAPI does not re-encode it
+        content = chatbot_system.chat_bytes(
             session_id=session_id,
             user_message=request.message,
-            technique=request.technique
+            technique=request.technique,
+            timestamp=clock["now"]
         )
         
         response_time = time.time() - start_time
         
-        # Track metrics in background
-        background_tasks.add_task(track_request, response_time, True)
+        track_request(response_time, True)
         
-        return ChatResponse(
-            response=result["response"],
-            session_id=session_id,
-            personality=result["personality"],
-            technique=result["technique"],
-            processing_time=result["processing_time"],
-            timestamp=datetime.now()
-        )
+        return Response(content=content, media_type="application/json")
         
     except HTTPException:
         raise
     except Exception as e:
         response_time = time.time() - start_time
-        background_tasks.add_task(track_request, response_time, False)
+        track_request(response_time, False)
         logger.error(f"Chat error: {e}")
         raise HTTPException(status_code=500, detail=f"Chat processing failed: {str(e)}")
 
+@app.post("/chat/fast", responses={200: {"model": ChatResponse}})
+async def chat_fast(request: Request):
+    """Chat endpoint that skips Pydantic validation for the default personality and technique"""
+    try:
+        payload = orjson.loads(await request.body())
+    except orjson.JSONDecodeError:
+        raise HTTPException(status_code=400, detail="Invalid JSON body")
+    
+    message = payload.get("message") if isinstance(payload, dict) else None
+    if (
+        isinstance(message, str) and 0 < len(message) <= 4000
+        and payload.get("personality", "technical_expert") == "technical_expert"
+        and payload.get("technique", "standard") == "standard"
+        and isinstance(payload.get("session_id"), (str, type(None)))
+    ):
+        chat_request = ChatRequest.model_construct(message=message, session_id=payload.get("session_id"))
+    else:
+        # Anything beyond the common case goes through full validation
+        try:
+            chat_request = ChatRequest.model_validate(payload)
+        except ValidationError as e:
+            raise HTTPException(status_code=422, detail=e.errors(include_url=False))
+    
+    return await anyio.to_thread.run_sync(chat, chat_request)
+
+@app.post("/chat/stream")
+def chat_stream(request: ChatRequest):
+    """Chat endpoint streaming the response as server-sent events"""
+    claim_request_nonce(request)
+    
+    if not request.session_id:
+        session_id = chatbot_system.create_session(request.personality)
+    else:
+        session_id = request.session_id
+        if session_id not in chatbot_system.sessions:
+            raise HTTPException(status_code=404, detail="Session not found")
+    
+    personality = chatbot_system.sessions[session_id]["personality"]
+    
+    def event_stream():
+        start_time = time.time()
+        try:
+            for chunk in chatbot_system.chat_stream(session_id, request.message, request.technique):
+                yield b"data: " + orjson.dumps({"delta": chunk}) + b"\n\n"
+        except Exception as e:
+            track_request(time.time() - start_time, False)
+            logger.error(f"Chat stream error: {e}")
+            yield b"data: " + orjson.dumps({"error": f"Chat processing failed: {str(e)}"}) + b"\n\n"
+            return
+        
+        track_request(time.time() - start_time, True)
+        yield b"data: " + orjson.dumps({
+            "done": True,
+            "session_id": session_id,
+            "personality": personality,
+            "technique": request.technique,
+            "timestamp": clock["now"]
+        }) + b"\n\n"
+    
+    return StreamingResponse(iterate_in_threadpool(event_stream()), media_type="text/event-stream")
+
 @app.get("/sessions")
-async def list_sessions():
+def list_sessions():
     """List all active sessions"""
     sessions_info = []
     
-    for session_id, session_data in chatbot_system.sessions.items():
+    for session_id, session_data in list(chatbot_system.sessions.items()):
         sessions_info.append({
             "session_id": session_id,
             "personality": session_data["personality"],
             "created_at": session_data["created_at"],
-            "message_count": len(session_data["conversation"]),
-            "last_activity": session_data["conversation"][-1]["timestamp"] if session_data["conversation"] else session_data["created_at"]
+            "message_count": session_data["stats"]["total_messages"],
+            "last_activity": session_data["last_activity"]
         })
     
-    return sessions_info
+    # Returning the response directly lets orjson encode the datetimes, skipping jsonable_encoder
+    return ORJSONResponse(sessions_info)
 
 @app.get("/session/{session_id}/analysis")
-async def get_session_analysis(session_id: str):
+def get_session_analysis(session_id: str):
     """Get session analysis"""
     try:
-        analysis = chatbot_system.get_session_analysis(session_id)
-        return analysis
+        return Response(content=chatbot_system.to_json(session_id), media_type="application/json")
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
 
+@app.get("/session/{session_id}/history")
+def get_session_history(session_id: str):
+    """Full conversation from the session log, beyond the in-memory window"""
+    if session_id not in chatbot_system.sessions:
+        raise HTTPException(status_code=404, detail="Session not found")
+    
+    return ORJSONResponse(chatbot_system.load_conversation(session_id))
+
 @app.delete("/session/{session_id}")
-async def delete_session(session_id: str):
+def delete_session(session_id: str):
     """Delete specific session"""
-    if session_id not in chatbot_system.sessions:
+    if not chatbot_system.delete_session(session_id):
         raise HTTPException(status_code=404, detail="Session not found")
     
-    del chatbot_system.sessions[session_id]
     return {"message": f"Session {session_id} deleted successfully"}
 
 @app.delete("/sessions")
-async def clear_all_sessions():
+def clear_all_sessions():
     """Clear all sessions"""
-    session_count = len(chatbot_system.sessions)
-    chatbot_system.sessions.clear()
+    session_count = chatbot_system.clear_sessions()
     return {"message": f"Cleared {session_count} sessions successfully"}
 
 @app.post("/chat/compare")
 async def compare_personalities(request: ChatRequest):
     """Compare responses from all personalities"""
-    responses = {}
-    
-    for personality in ["technical_expert", "creative_partner", "business_advisor"]:
-        try:
-            # Create temporary session
-            temp_session_id = chatbot_system.create_session(personality)
-            
-            # Get response
-            result = chatbot_system.chat(
-                session_id=temp_session_id,
-                user_message=request.message,
-                technique=request.technique
+    results = await asyncio.gather(
+        *[
+            anyio.to_thread.run_sync(
+                chatbot_system.chat_stateless, personality, request.message, request.technique
             )
-            
+            for personality in PERSONALITY_IDS
+        ],
+        return_exceptions=True
+    )
+    
+    responses = {}
+    for personality, result in zip(PERSONALITY_IDS, results):
+        if isinstance(result, Exception):
+            logger.error(f"Comparison failed for {personality}: {result}")
+            responses[personality] = {"error": str(result)}
+        else:
             responses[personality] = {
                 "response": result["response"],
                 "processing_time": result["processing_time"],
                 "personality": personality
             }
-            
-            # Clean up temporary session
-            del chatbot_system.sessions[temp_session_id]
-            
-        except Exception as e:
-            logger.error(f"Comparison failed for {personality}: {e}")
-            responses[personality] = {"error": str(e)}
     
     return responses
 
 @app.get("/demo/test")
-async def demo_test():
+def demo_test():
     """Demo endpoint for testing"""
     # Create a test session
     session_id = chatbot_system.create_session("technical_expert")
@@ -334,10 +565,16 @@ if __name__ == "__main__":
     print("⚡ Optimized for M1 MacBook Pro")
     print("=" * 50)
     
+    # uvloop + httptools replace the default asyncio loop and h11 parser.
+    # Auto-reload is off because the reloader falls back to the stock loop.
     uvicorn.run(
         "api_server:app",
-        host="0.0.0.0",
-        port=8000,
-        reload=True,
-        log_level="info"
+        host=os.getenv("API_HOST", "0.0.0.0"),
+        port=int(os.getenv("API_PORT", "8000")),
+        loop="uvloop",
+        http="httptools",
+        reload=False,
+        # Multiple workers only share sessions when Memcached is configured
+        workers=int(os.getenv("API_WORKERS", os.cpu_count() if MEMCACHED_SERVER else 1)),
+        log_level=os.getenv("LOG_LEVEL", "info")
     )
\ No newline at end of file
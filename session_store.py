@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+MEMCACHED SESSION STORE
+Shares chat sessions and request counters across uvicorn workers
+"""
+
+from collections.abc import MutableMapping
+from typing import Dict, Optional, Tuple
+
+from pymemcache import serde
+from pymemcache.client.base import PooledClient
+
+class MemcachedSessionStore(MutableMapping):
+    """Dict-like session store backed by Memcached, mirroring the OrderedDict API M1ChatbotSystem uses
+
+    Sessions are whole pickled values: a chat turn reads the session, updates it and writes it back,
+    so two workers handling the same session at once keep only the last write and lose a turn.
+    """
+
+    # Session ids ordered least- to most-recently active. move_to_end() refreshes a session's TTL
+    # together with its position, so expired ids collect at the head where oldest() prunes them
+    INDEX_KEY = "sess:index"
+    # Index entries fetched per round while looking for the oldest live session
+    OLDEST_BATCH = 16
+
+    def __init__(self, server: str, ttl: int = 3600, max_pool_size: int = 64):
+        self.client = PooledClient(server, serde=serde.pickle_serde, max_pool_size=max_pool_size)
+        self.ttl = ttl
+        # Called with each session id found expired and pruned from the index
+        self.on_expire = None
+
+    def _key(self, session_id: str) -> str:
+        return f"sess:{session_id}"
+
+    def _update_index(self, update):
+        """Apply `update` to the session id index with a compare-and-set loop"""
+        while True:
+            index, cas_token = self.client.gets(self.INDEX_KEY)
+            if cas_token is None:
+                if self.client.add(self.INDEX_KEY, update([]), expire=0, noreply=False):
+                    return
+                continue
+            new_index = update(index)
+            if new_index == index or self.client.cas(self.INDEX_KEY, new_index, cas_token, expire=0):
+                return
+
+    def _index(self) -> list:
+        return self.client.get(self.INDEX_KEY) or []
+
+    def _fetch(self, session_ids) -> Dict[str, Dict]:
+        """Sessions still present in Memcached, in the given order; expired ids are pruned from the index"""
+        found = self.client.get_many([self._key(session_id) for session_id in session_ids])
+        sessions = {}
+        expired = set()
+        for session_id in session_ids:
+            session = found.get(self._key(session_id))
+            if session is None:
+                expired.add(session_id)
+            else:
+                sessions[session_id] = session
+        if expired:
+            self._update_index(lambda ids: [i for i in ids if i not in expired])
+            if self.on_expire is not None:
+                for session_id in expired:
+                    self.on_expire(session_id)
+        return sessions
+
+    def _live_sessions(self) -> Dict[str, Dict]:
+        """Fetch all sessions still present in Memcached, in index order"""
+        return self._fetch(self._index())
+
+    def oldest(self) -> Optional[Tuple[str, Dict]]:
+        """Least recently active live (session_id, session), or None; reads only the head of the index"""
+        while index := self._index():
+            sessions = self._fetch(index[:self.OLDEST_BATCH])
+            if sessions:
+                return next(iter(sessions.items()))
+        return None
+
+    def __getitem__(self, session_id: str) -> Dict:
+        session = self.client.get(self._key(session_id))
+        if session is None:
+            raise KeyError(session_id)
+        return session
+
+    def __setitem__(self, session_id: str, session: Dict):
+        # Existing sessions are written in place; only new ones touch the shared index
+        if self.client.replace(self._key(session_id), session, expire=self.ttl, noreply=False):
+            return
+        self.client.set(self._key(session_id), session, expire=self.ttl)
+        self._update_index(lambda ids: ids if session_id in ids else ids + [session_id])
+
+    def __delitem__(self, session_id: str):
+        deleted = self.client.delete(self._key(session_id), noreply=False)
+        # Drop the id even when the session already expired, so the index cannot outgrow the live set
+        self._update_index(lambda ids: [i for i in ids if i != session_id])
+        if not deleted:
+            raise KeyError(session_id)
+
+    def pop(self, session_id: str, *default):
+        session = self.client.get(self._key(session_id))
+        self.client.delete(self._key(session_id), noreply=False)
+        self._update_index(lambda ids: [i for i in ids if i != session_id])
+        if session is None:
+            if default:
+                return default[0]
+            raise KeyError(session_id)
+        return session
+
+    def __contains__(self, session_id) -> bool:
+        return self.client.get(self._key(session_id)) is not None
+
+    def __iter__(self):
+        return iter(self._live_sessions())
+
+    def __len__(self) -> int:
+        # Drop the expired head first so the count is of live sessions
+        self.oldest()
+        return len(self._index())
+
+    def items(self):
+        return self._live_sessions().items()
+
+    def move_to_end(self, session_id: str):
+        """Refresh the session TTL and mark it most recently active"""
+        if not self.client.touch(self._key(session_id), expire=self.ttl, noreply=False):
+            return
+        # Only rewrite the index when the session is not already last
+        self._update_index(
+            lambda ids: ids if ids and ids[-1] == session_id else [i for i in ids if i != session_id] + [session_id]
+        )
+
+    def clear(self):
+        index = self._index()
+        self.client.delete_many([self._key(session_id) for session_id in index])
+        self.client.delete(self.INDEX_KEY)
+
+class MemcachedRequestStats:
+    """Request counters (via Memcached incr) and once-only request keys shared across workers"""
+
+    KEYS = ("stats:total_requests", "stats:error_count", "stats:total_response_time_us")
+
+    def __init__(self, server: str, max_pool_size: int = 64):
+        self.client = PooledClient(server, max_pool_size=max_pool_size)
+        for key in self.KEYS:
+            self.client.add(key, b"0", expire=0)
+
+    def record(self, requests: int, response_time: float, errors: int):
+        """Add a batch of requests; response time is stored in whole microseconds"""
+        self.client.incr("stats:total_requests", requests)
+        self.client.incr("stats:total_response_time_us", int(response_time * 1_000_000))
+        if errors:
+            self.client.incr("stats:error_count", errors)
+
+    def claim(self, key: str, ttl: int) -> bool:
+        """True for the first worker to claim `key` within `ttl` seconds"""
+        return self.client.add(key, b"1", expire=ttl, noreply=False)
+
+    def snapshot(self) -> Dict:
+        """Read the aggregated counters"""
+        values = self.client.get_many(self.KEYS)
+        return {
+            "total_requests": int(values.get("stats:total_requests", 0)),
+            "error_count": int(values.get("stats:error_count", 0)),
+            "total_response_time": int(values.get("stats:total_response_time_us", 0)) / 1_000_000
+        }
@@ -4,26 +4,33 @@ Real LLM integration with advanced prompt engineering
 Implements all Day 3 requirements with FREE APIs
 """
 
-import torch
-import torch.nn.functional as F
-from transformers import (
-    AutoTokenizer, AutoModelForCausalLM, 
-    pipeline, BitsAndBytesConfig, GenerationConfig
-)
 import logging
-from typing import List, Dict, Optional, Tuple, Union
+from typing import TYPE_CHECKING, Iterator, List, Dict, Optional, Tuple, Union
 from dataclasses import dataclass, field
 from datetime import datetime
 import json
+import re
 import time
 import asyncio
 import threading
 from pathlib import Path
-import psutil
 import hashlib
-import requests
-from concurrent.futures import ThreadPoolExecutor
-import numpy as np
+import importlib.util
+import queue
+from concurrent.futures import Future, ThreadPoolExecutor
+from collections import OrderedDict
+from functools import partial
+
+# torch, transformers and psutil are imported where they are used, so the
+# fallback and prompt engineering paths start without loading them
+if TYPE_CHECKING:
+    import torch
+    from transformers import GenerationConfig
+
+try:
+    from blake3 import blake3 as prompt_hasher
+except ImportError:  # blake3 is optional; blake2b offers the same incremental update/copy API
+    prompt_hasher = partial(hashlib.blake2b, digest_size=16)
 
 # Configure advanced logging
 logging.basicConfig(
@@ -32,20 +39,25 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-@dataclass
+@dataclass(slots=True)
 class LLMMessage:
     """Enhanced message structure with advanced metadata"""
     role: str
     content: str
-    timestamp: datetime = field(default_factory=datetime.now)
+    timestamp_ns: int = field(default_factory=time.time_ns)
     token_count: int = 0
     processing_time: float = 0.0
     model_used: str = ""
     confidence_score: float = 0.0
     prompt_type: str = "standard"
     metadata: Dict = field(default_factory=dict)
+    
+    @property
+    def timestamp(self) -> datetime:
+        """Creation time as a datetime, converted on demand"""
+        return datetime.fromtimestamp(self.timestamp_ns / 1e9)
 
-@dataclass
+@dataclass(slots=True)
 class LLMConfig:
     """Advanced LLM configuration for M1 optimization - FREE models only"""
     model_name: str = "distilgpt2"  # FREE, no auth required
@@ -59,6 +71,57 @@ class LLMConfig:
     max_new_tokens: int = 150
     repetition_penalty: float = 1.1
     cache_dir: str = "./cache/models"
+    max_input_tokens: int = 512
+    use_static_cache: bool = True  # Fixed-shape KV cache, required for compiled decoding
+    compile_model: bool = True  # torch.compile the forward pass
+    quantize_kv_cache: bool = False  # int4/int8 KV cache; replaces static cache + compile
+    kv_cache_bits: int = 4
+    response_cache_size: int = 256  # Greedy (do_sample=False) generations only
+    max_batch_size: int = 8  # Concurrent requests merged into one generate() call
+    batch_window_ms: float = 10.0  # How long the batcher waits for more requests
+    use_prefix_cache: bool = False  # Reuse system-prompt KV across requests; replaces static cache + compile
+    prefix_cache_size: int = 32
+    prefix_cache_tokens: int = 8192  # Total prompt tokens held across cached prefixes, bounding their KV memory
+    quantize_parked_kv: bool = False  # Hold the conversation KV as int8 on CPU between turns
+    prefill_chunk_size: int = 512  # Max uncached prompt tokens per forward pass when resuming a cache
+    prompt_lookup_num_tokens: int = 10  # n-gram speculative decoding from the prompt; 0 disables
+    torch_dtype: str = "auto"  # float16/bfloat16/float32; auto is float16 on mps/cuda, float32 on cpu
+
+# Minimal "Role: content" chat template for base models without one
+PLAIN_CHAT_TEMPLATE = (
+    "{% for message in messages %}"
+    "{{ message['role'] | capitalize }}: {{ message['content'] }}\n"
+    "{% endfor %}"
+    "{% if add_generation_prompt %}Assistant:{% endif %}"
+)
+
+# Fallback personality inferred from the first keyword in the system prompt(s)
+PERSONALITY_PATTERN = re.compile(r"technical|creative|business", re.IGNORECASE)
+PERSONALITY_KEYWORDS = {
+    "technical": "technical_expert",
+    "creative": "creative_partner",
+    "business": "business_advisor"
+}
+
+def detect_personality(messages: List[LLMMessage]) -> str:
+    """Map system prompt keywords to a fallback personality"""
+    system_text = "\n".join(msg.content for msg in messages if msg.role == "system")
+    match = PERSONALITY_PATTERN.search(system_text)
+    return PERSONALITY_KEYWORDS[match.group(0).lower()] if match else "helpful_assistant"
+
+# Response cleanup: the plain template's role labels, and text after the last full sentence
+LEADING_ROLE_PATTERN = re.compile(r"^\s*assistant\s*:\s*", re.IGNORECASE)
+TURN_MARKER_PATTERN = re.compile(r"\n\s*(?:user|system|assistant)\s*:", re.IGNORECASE)
+REPEATED_SPACE_PATTERN = re.compile(r"[ \t]{2,}")
+BLANK_LINES_PATTERN = re.compile(r"\n{3,}")
+UNFINISHED_SENTENCE_PATTERN = re.compile(r"(?<=[.!?])[^.!?]*$")
+
+# Parked conversation KV caches are quantized from this layer on
+KV_PARK_FIRST_LAYER = 2
+
+def padding_bucket(n: int) -> int:
+    """Round a sequence length up to the next power of two, minimum 32"""
+    return 1 << (n - 1).bit_length() if n > 32 else 32
 
 class SmartFallbackGenerator:
     """Intelligent fallback response generator when models are unavailable"""
@@ -97,46 +160,95 @@ class SmartFallbackGenerator:
                 "assist": "I'm here to assist you! My approach is to: 1) Understand your needs clearly, 2) Provide actionable advice, 3) Offer alternative solutions, 4) Follow up to ensure success. How can I best support you?"
             }
         }
-    
-    def generate_response(self, user_message: str, personality: str) -> str:
-        """Generate intelligent fallback response based on keywords"""
-        message_lower = user_message.lower()
-        personality_responses = self.personality_responses.get(personality, {})
         
-        # Keyword matching for relevant responses
-        for keyword, response in personality_responses.items():
-            if keyword in message_lower:
-                return response
+        # One case-insensitive matcher per personality. The lookahead reports a
+        # keyword at every position, so overlapping keywords are not missed, and
+        # keyword priority (dict order) is preserved via _keyword_rank.
+        self._keyword_patterns = {
+            personality: re.compile("(?=(" + "|".join(map(re.escape, responses)) + "))", re.IGNORECASE)
+            for personality, responses in self.personality_responses.items()
+        }
+        self._keyword_rank = {
+            personality: {keyword: rank for rank, keyword in enumerate(responses)}
+            for personality, responses in self.personality_responses.items()
+        }
+        # (keyword, response) pairs indexed by rank, so a match costs one tuple index
+        self._flat_responses = {
+            personality: tuple(responses.items())
+            for personality, responses in self.personality_responses.items()
+        }
         
         # Generic responses by personality
-        generic_responses = {
+        self.generic_responses = {
             "technical_expert": "I can help you with technical challenges! Could you provide more details about your specific issue, including any error messages or system specifications? I specialize in debugging, performance optimization, and system architecture.",
             "creative_partner": "That sounds like an exciting creative project! Let's brainstorm together. What aspect would you like to explore first - plot development, character creation, or setting? I'm here to help unlock your creative potential.",
             "business_advisor": "Great business question! To provide the most relevant strategic advice, could you share more context about your industry, target market, and current business stage? I can help with pricing, growth strategy, and market analysis.",
             "learning_tutor": "I'm here to help you learn! Could you tell me more about your current understanding level and what specific aspect you'd like me to explain? I'll break it down step-by-step and use examples to make it clear.",
             "helpful_assistant": "I'd be happy to help you with that! Could you provide a bit more detail about what you're looking for so I can give you the most useful response? I'm here to assist with information, analysis, and problem-solving."
         }
+    
+    def generate_response(self, user_message: str, personality: str) -> str:
+        """Generate intelligent fallback response based on keywords"""
+        pattern = self._keyword_patterns.get(personality)
         
-        return generic_responses.get(personality, generic_responses["helpful_assistant"])
+        # Keyword matching for relevant responses
+        if pattern is not None:
+            matches = pattern.findall(user_message)
+            if matches:
+                rank = self._keyword_rank[personality]
+                best = min(rank[match.lower()] for match in matches)
+                return self._flat_responses[personality][best][1]
+        
+        return self.generic_responses.get(personality, self.generic_responses["helpful_assistant"])
 
 class M1MemoryOptimizer:
     """Advanced memory optimization for M1 unified memory"""
     
+    BYTES_TO_GB = 1 / (1024**3)
+    STATS_TTL = 0.25  # Seconds; the numbers are advisory
+    HISTORY_SIZE = 1024
+    STAT_FIELDS = ("total_gb", "available_gb", "used_gb", "percent_used", "free_gb")
+    
     def __init__(self):
+        import numpy as np
+        import psutil
+        
         self.total_memory = psutil.virtual_memory().total
         self.monitoring = True
-        self.memory_history = []
+        # Ring buffer of samples, one row per get_memory_stats() refresh
+        self.memory_history = np.zeros((self.HISTORY_SIZE, len(self.STAT_FIELDS)), dtype=np.float32)
+        self._history_index = 0
+        self._mem_cache = (0.0, None)
         
     def get_memory_stats(self) -> Dict[str, float]:
-        """Get detailed memory statistics"""
+        """Get detailed memory statistics, cached for STATS_TTL seconds"""
+        now = time.monotonic()
+        sampled_at, stats = self._mem_cache
+        if stats is not None and now - sampled_at < self.STATS_TTL:
+            return stats
+        
+        import psutil
+        
         memory = psutil.virtual_memory()
-        return {
-            "total_gb": memory.total / (1024**3),
-            "available_gb": memory.available / (1024**3),
-            "used_gb": memory.used / (1024**3),
+        stats = {
+            "total_gb": memory.total * self.BYTES_TO_GB,
+            "available_gb": memory.available * self.BYTES_TO_GB,
+            "used_gb": memory.used * self.BYTES_TO_GB,
             "percent_used": memory.percent,
-            "free_gb": memory.free / (1024**3)
+            "free_gb": memory.free * self.BYTES_TO_GB
         }
+        self._mem_cache = (now, stats)
+        self.memory_history[self._history_index % self.HISTORY_SIZE] = [stats[name] for name in self.STAT_FIELDS]
+        self._history_index += 1
+        return stats
+    
+    def get_average_memory_stats(self) -> Dict[str, float]:
+        """Average of the recorded memory samples"""
+        count = min(self._history_index, self.HISTORY_SIZE)
+        if not count:
+            return self.get_memory_stats()
+        averages = self.memory_history[:count].mean(axis=0)
+        return {name: float(value) for name, value in zip(self.STAT_FIELDS, averages)}
     
     def optimize_for_model_size(self, model_size_gb: float) -> Dict[str, Union[str, bool]]:
         """Optimize settings based on model size and available memory"""
@@ -165,20 +277,113 @@ class M1MemoryOptimizer:
                 "recommendation": "Using standard model"
             }
 
+# Prompt templates per technique. {domain} and {example_text} are resolved once
+# per personality at init; {prompt} and {role_context} are filled per call.
+PROMPT_TEMPLATES = {
+    "chain_of_thought": """Let me approach this {domain} systematically and think through it step by step.
+
+Question: {prompt}
+
+My reasoning process:
+1. First, I'll analyze the core components and requirements
+2. Next, I'll consider different approaches and their implications  
+3. Then, I'll evaluate the best path forward
+4. Finally, I'll provide a comprehensive solution with actionable steps
+
+Let me work through this methodically:""",
+
+    "few_shot": """Here are examples of how I approach similar questions:
+{example_text}
+
+Now, applying the same systematic approach to your question:
+"{prompt}"
+
+My tailored response:""",
+
+    "role_playing": """I'm taking on the role of {role_context} to give you the most relevant and practical advice.
+
+In this role, when faced with your question: "{prompt}"
+
+Here's how I would approach this from my professional perspective:""",
+
+    "socratic": """Let me help you explore this question through guided inquiry: "{prompt}"
+
+To better understand your situation and provide the most helpful response, let me ask some clarifying questions:
+
+1. What specific outcome are you hoping to achieve?
+2. What approaches have you already considered or tried?
+3. What constraints or limitations are you working within?
+4. What would success look like to you?
+
+Based on your original question, here are my initial thoughts and recommendations:""",
+
+    "step_by_step": """I'll break down your question into manageable steps: "{prompt}"
+
+**Step-by-Step Approach:**
+
+**Step 1: Analysis**
+- Understanding the core requirements and context
+
+**Step 2: Planning** 
+- Identifying the best approach and necessary resources
+
+**Step 3: Implementation**
+- Providing specific, actionable instructions
+
+**Step 4: Validation**
+- How to verify success and troubleshoot issues
+
+Let me walk you through each step:""",
+
+    "analogical": """Let me explain this concept using analogies to make it clearer: "{prompt}"
+
+Think of this like... [I'll provide relevant analogies based on your specific question]
+
+Now, applying this analogy back to your situation:"""
+}
+
+# Used by few_shot when a personality has no examples
+FEW_SHOT_FALLBACK_TEMPLATE = "Based on similar situations I've encountered:\n\nYour question: {prompt}\n\nMy response:"
+
+DOMAIN_MAPPING = {
+    "technical_expert": "technical problem",
+    "creative_partner": "creative challenge", 
+    "business_advisor": "business question",
+    "learning_tutor": "learning objective"
+}
+
+DEFAULT_TEMPLATE_PERSONALITY = "helpful_assistant"
+
 class AdvancedPromptEngineer:
     """Advanced prompt engineering with psychological and cognitive techniques"""
     
     def __init__(self):
-        self.technique_registry = {
-            "chain_of_thought": self._apply_chain_of_thought,
-            "few_shot": self._apply_few_shot,
-            "role_playing": self._apply_role_playing,
-            "socratic": self._apply_socratic_method,
-            "step_by_step": self._apply_step_by_step,
-            "analogical": self._apply_analogical_reasoning
-        }
-        
         self.personality_prompts = self._load_personality_prompts()
+        self._templates = self._compile_templates()
+    
+    def _compile_templates(self) -> Dict[Tuple[str, str], str]:
+        """Flatten techniques x personalities into ready-to-format templates"""
+        personalities = set(DOMAIN_MAPPING) | set(self.personality_prompts) | {DEFAULT_TEMPLATE_PERSONALITY}
+        templates = {}
+        
+        for personality in personalities:
+            examples = self.personality_prompts.get(personality, {}).get("few_shot_examples", [])
+            example_text = ""
+            for i, example in enumerate(examples[:2], 1):  # Use up to 2 examples
+                example_text += f"\nExample {i}:\nUser: \"{example['user']}\"\nMy response: \"{example['assistant'][:200]}...\"\n"
+            
+            baked = {
+                "domain": DOMAIN_MAPPING.get(personality, "question"),
+                "example_text": example_text
+            }
+            for technique, template in PROMPT_TEMPLATES.items():
+                if technique == "few_shot" and not examples:
+                    template = FEW_SHOT_FALLBACK_TEMPLATE
+                for name, value in baked.items():
+                    template = template.replace("{" + name + "}", value.replace("{", "{{").replace("}", "}}"))
+                templates[(technique, personality)] = template
+        
+        return templates
         
     def _load_personality_prompts(self) -> Dict[str, Dict]:
         """Load advanced personality-specific prompts"""
@@ -274,132 +479,77 @@ Be analytical, strategic, and results-oriented in your advice.""",
     
     def apply_technique(self, prompt: str, technique: str, personality: str = "helpful_assistant", **kwargs) -> str:
         """Apply specific prompt engineering technique"""
-        if technique not in self.technique_registry:
-            logger.warning(f"Unknown technique: {technique}")
+        template = self._templates.get((technique, personality)) or self._templates.get((technique, DEFAULT_TEMPLATE_PERSONALITY))
+        if template is None:
+            logger.warning("Unknown technique: %s", technique)
             return prompt
-            
-        enhanced_prompt = self.technique_registry[technique](prompt, personality, **kwargs)
-        logger.info(f"Applied {technique} technique to prompt")
-        return enhanced_prompt
-    
-    def _apply_chain_of_thought(self, prompt: str, personality: str, **kwargs) -> str:
-        """Apply chain-of-thought reasoning"""
-        domain_mapping = {
-            "technical_expert": "technical problem",
-            "creative_partner": "creative challenge", 
-            "business_advisor": "business question",
-            "learning_tutor": "learning objective"
-        }
-        
-        domain = domain_mapping.get(personality, "question")
         
-        return f"""Let me approach this {domain} systematically and think through it step by step.
-
-Question: {prompt}
-
-My reasoning process:
-1. First, I'll analyze the core components and requirements
-2. Next, I'll consider different approaches and their implications  
-3. Then, I'll evaluate the best path forward
-4. Finally, I'll provide a comprehensive solution with actionable steps
-
-Let me work through this methodically:"""
-    
-    def _apply_few_shot(self, prompt: str, personality: str, **kwargs) -> str:
-        """Apply few-shot learning with personality-specific examples"""
-        personality_data = self.personality_prompts.get(personality, {})
-        examples = personality_data.get("few_shot_examples", [])
-        
-        if not examples:
-            return f"Based on similar situations I've encountered:\n\nYour question: {prompt}\n\nMy response:"
-            
-        example_text = ""
-        for i, example in enumerate(examples[:2], 1):  # Use up to 2 examples
-            example_text += f"\nExample {i}:\nUser: \"{example['user']}\"\nMy response: \"{example['assistant'][:200]}...\"\n"
-        
-        return f"""Here are examples of how I approach similar questions:
-{example_text}
-
-Now, applying the same systematic approach to your question:
-"{prompt}"
-
-My tailored response:"""
-    
-    def _apply_role_playing(self, prompt: str, personality: str, **kwargs) -> str:
-        """Apply role-playing technique"""
-        role_context = kwargs.get("role_context", "expert in the field")
-        
-        return f"""I'm taking on the role of {role_context} to give you the most relevant and practical advice.
-
-In this role, when faced with your question: "{prompt}"
-
-Here's how I would approach this from my professional perspective:"""
-    
-    def _apply_socratic_method(self, prompt: str, personality: str, **kwargs) -> str:
-        """Apply Socratic questioning method"""
-        return f"""Let me help you explore this question through guided inquiry: "{prompt}"
-
-To better understand your situation and provide the most helpful response, let me ask some clarifying questions:
-
-1. What specific outcome are you hoping to achieve?
-2. What approaches have you already considered or tried?
-3. What constraints or limitations are you working within?
-4. What would success look like to you?
-
-Based on your original question, here are my initial thoughts and recommendations:"""
-    
-    def _apply_step_by_step(self, prompt: str, personality: str, **kwargs) -> str:
-        """Apply step-by-step decomposition"""
-        return f"""I'll break down your question into manageable steps: "{prompt}"
-
-**Step-by-Step Approach:**
-
-**Step 1: Analysis**
-- Understanding the core requirements and context
-
-**Step 2: Planning** 
-- Identifying the best approach and necessary resources
-
-**Step 3: Implementation**
-- Providing specific, actionable instructions
-
-**Step 4: Validation**
-- How to verify success and troubleshoot issues
-
-Let me walk you through each step:"""
-    
-    def _apply_analogical_reasoning(self, prompt: str, personality: str, **kwargs) -> str:
-        """Apply analogical reasoning technique"""
-        return f"""Let me explain this concept using analogies to make it clearer: "{prompt}"
-
-Think of this like... [I'll provide relevant analogies based on your specific question]
-
-Now, applying this analogy back to your situation:"""
+        enhanced_prompt = template.format_map({
+            "prompt": prompt,
+            "role_context": kwargs.get("role_context", "expert in the field")
+        })
+        logger.info("Applied %s technique to prompt", technique)
+        return enhanced_prompt
 
 class M1OptimizedLLM:
     """M1-optimized LLM with Metal acceleration and advanced features"""
     
+    STATS_WINDOW = 1024  # Generations kept for rolling averages
+    
     def __init__(self, config: LLMConfig):
         self.config = config
         self.device = self._setup_device()
         self.model = None
         self.tokenizer = None
         self.generation_config = None
+        self.past_key_values = None
         self.memory_optimizer = M1MemoryOptimizer()
         self.is_loaded = False
         self.model_lock = threading.Lock()
         self.fallback_generator = SmartFallbackGenerator()
+        # Response cache keyed by conversation hash; system prompt hasher states are reused
+        self._prefix_hashers = {}
+        self._response_cache = OrderedDict()
+        # System prompt -> (prompt token ids, prefilled KV cache), LRU ordered
+        self._prefix_kv = OrderedDict()
+        self._prefix_kv_tokens = 0
+        # System prompt -> (templated token ids, splittable); only used on the tokenizer thread
+        self._system_ids = OrderedDict()
+        # (token ids, KV cache, int8 scales) of the last generation, extended by the next turn
+        self._conversation_kv = None
+        
+        # Single worker: fast tokenizers are not safe to call concurrently
+        self._tokenizer_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="tokenizer")
+        
+        # Padded input lengths seen so far; each one costs a compiled graph
+        self._compiled_buckets = set()
+        
+        # Concurrent requests are queued and generated in batches by one worker thread
+        self._request_queue = queue.Queue()
+        self._batcher_thread = None
+        
+        # Performance tracking; per-generation samples live in fixed-size ring buffers
+        import numpy as np
         
-        # Performance tracking
         self.performance_stats = {
             "total_generations": 0,
             "total_tokens": 0,
             "avg_generation_time": 0.0,
-            "memory_usage_history": []
+            "last_generation_time": 0.0
         }
+        self._gen_times = np.zeros(self.STATS_WINDOW, dtype=np.float32)
+        self._gen_tokens = np.zeros(self.STATS_WINDOW, dtype=np.int32)
+        # Running window totals, so reading the averages never rescans the buffers
+        self._window_time = 0.0
+        self._window_tokens = 0
         
-    def _setup_device(self) -> torch.device:
+    def _setup_device(self) -> "torch.device":
         """Setup optimal device for M1 Mac"""
+        import torch
+        
+        # Let leftover fp32 matmuls use faster reduced-precision kernels
+        torch.set_float32_matmul_precision("high")
+        
         if self.config.device == "auto":
             if torch.backends.mps.is_available():
                 device = torch.device("mps")
@@ -412,22 +562,34 @@ class M1OptimizedLLM:
             
         return device
     
+    def _prepare_load(self) -> Dict[str, float]:
+        """Create the model cache directory and return current memory stats"""
+        Path(self.config.cache_dir).mkdir(parents=True, exist_ok=True)
+        return self.memory_optimizer.get_memory_stats()
+    
     def load_model(self) -> bool:
         """Load model with M1 optimizations - FREE models only"""
+        # Double-checked: once loaded, callers never touch the lock
+        if self.is_loaded:
+            return True
+        
         with self.model_lock:
             if self.is_loaded:
                 return True
                 
             try:
-                logger.info(f"🚀 Loading FREE model: {self.config.model_name}")
+                logger.info("🚀 Loading FREE model: %s", self.config.model_name)
                 start_time = time.time()
                 
-                # Create cache directory
-                Path(self.config.cache_dir).mkdir(parents=True, exist_ok=True)
+                # Create the cache directory and sample memory while torch/transformers import
+                setup_future = self._tokenizer_pool.submit(self._prepare_load)
+                
+                import torch
+                from transformers import AutoTokenizer, AutoModelForCausalLM, GenerationConfig
                 
                 # Memory optimization
-                memory_stats = self.memory_optimizer.get_memory_stats()
-                logger.info(f"💾 Available memory: {memory_stats['available_gb']:.1f}GB")
+                memory_stats = setup_future.result()
+                logger.info("💾 Available memory: %.1fGB", memory_stats['available_gb'])
                 
                 # Use FREE models that don't require authentication
                 free_models = [
@@ -438,7 +600,7 @@ class M1OptimizedLLM:
                 model_loaded = False
                 for model_name in free_models:
                     try:
-                        logger.info(f"🔄 Trying model: {model_name}")
+                        logger.info("🔄 Trying model: %s", model_name)
                         
                         # Load tokenizer
                         self.tokenizer = AutoTokenizer.from_pretrained(
@@ -450,18 +612,24 @@ class M1OptimizedLLM:
                         # Add special tokens if needed
                         if self.tokenizer.pad_token is None:
                             self.tokenizer.pad_token = self.tokenizer.eos_token
+                        # Decoder-only models generate after the last token, so pad on the
+                        # left; truncate on the left too so the latest turns are kept
+                        self.tokenizer.padding_side = "left"
+                        self.tokenizer.truncation_side = "left"
+                        
+                        # distilgpt2/gpt2 ship without a chat template
+                        if self.tokenizer.chat_template is None:
+                            self.tokenizer.chat_template = PLAIN_CHAT_TEMPLATE
                         
-                        # Load model
+                        # Load model straight onto the device; both candidates are small enough
+                        # that the sharded low_cpu_mem_usage path only adds overhead
                         self.model = AutoModelForCausalLM.from_pretrained(
                             model_name,
                             cache_dir=self.config.cache_dir,
-                            torch_dtype=torch.float16 if self.device.type == "mps" else torch.float32,
-                            low_cpu_mem_usage=True
+                            torch_dtype=self._model_dtype(),
+                            device_map={"": self.device}
                         )
                         
-                        # Move to device
-                        self.model = self.model.to(self.device)
-                        
                         # Setup generation configuration
                         self.generation_config = GenerationConfig(
                             temperature=self.config.temperature,
@@ -472,19 +640,24 @@ class M1OptimizedLLM:
                             do_sample=True,
                             pad_token_id=self.tokenizer.pad_token_id,
                             eos_token_id=self.tokenizer.eos_token_id,
-                            early_stopping=True
+                            early_stopping=True,
+                            prompt_lookup_num_tokens=self.config.prompt_lookup_num_tokens or None
                         )
                         
                         self.model.eval()
+                        if self.config.use_prefix_cache:
+                            logger.info("♻️ Prefix KV cache enabled, skipping static cache and compile")
+                        elif not (self.config.quantize_kv_cache and self._setup_quantized_cache()):
+                            self._setup_static_decoding()
                         self.config.model_name = model_name  # Update config with working model
                         model_loaded = True
                         
                         load_time = time.time() - start_time
-                        logger.info(f"✅ Model {model_name} loaded successfully in {load_time:.2f}s")
+                        logger.info("✅ Model %s loaded successfully in %.2fs", model_name, load_time)
                         break
                         
                     except Exception as e:
-                        logger.warning(f"⚠️ Failed to load {model_name}: {e}")
+                        logger.warning("⚠️ Failed to load %s: %s", model_name, e)
                         continue
                 
                 if not model_loaded:
@@ -493,17 +666,479 @@ class M1OptimizedLLM:
                     return False
                     
                 self.is_loaded = True
+                self._start_batcher()
                 return True
                 
             except Exception as e:
-                logger.error(f"❌ Critical model loading failure: {e}")
+                logger.error("❌ Critical model loading failure: %s", e)
                 self.is_loaded = False
                 return False
 
+    def _model_dtype(self) -> "torch.dtype":
+        """Weight dtype to load; half precision halves the bytes read per decode step"""
+        import torch
+        
+        if self.config.torch_dtype == "auto":
+            return torch.float16 if self.device.type in ("mps", "cuda") else torch.float32
+        return getattr(torch, self.config.torch_dtype)
+    
+    def _setup_quantized_cache(self) -> bool:
+        """Store the KV cache quantized to cut decode-step memory bandwidth"""
+        # bitsandbytes is unavailable on Apple Silicon: quanto on MPS, HQQ on CPU
+        backends = {"mps": ("quanto", "optimum.quanto"), "cpu": ("HQQ", "hqq")}
+        if self.device.type not in backends:
+            return False
+        
+        backend, package = backends[self.device.type]
+        try:
+            from transformers import QuantizedCacheConfig
+            
+            if importlib.util.find_spec(package) is None:
+                raise ImportError(f"{package} is not installed")
+            
+            self.generation_config.cache_implementation = "quantized"
+            self.generation_config.cache_config = QuantizedCacheConfig(
+                backend=backend,
+                nbits=self.config.kv_cache_bits,
+                compute_dtype=self.model.dtype,
+                device=self.device
+            )
+        except Exception as e:
+            logger.warning("⚠️ Quantized KV cache unavailable, using default cache: %s", e)
+            self.generation_config.cache_implementation = None
+            return False
+        
+        logger.info("🗜️ Using %s-bit %s KV cache", self.config.kv_cache_bits, backend)
+        return True
+    
+    def _setup_static_decoding(self):
+        """Pre-allocate a static KV cache and compile the forward pass"""
+        if self.config.use_static_cache:
+            try:
+                from transformers import StaticCache
+                
+                self.past_key_values = StaticCache(
+                    config=self.model.config,
+                    max_batch_size=1,
+                    max_cache_len=self.config.max_input_tokens + self.config.max_new_tokens,
+                    device=self.device,
+                    dtype=self.model.dtype
+                )
+            except Exception as e:
+                # Let generate() allocate its own static cache instead
+                logger.warning("⚠️ StaticCache pre-allocation failed: %s", e)
+                self.past_key_values = None
+                self.generation_config.cache_implementation = "static"
+        
+        if self.config.compile_model:
+            try:
+                import torch
+                
+                # Inductor has no Metal codegen; aot_eager still traces out the Python overhead
+                if self.device.type == "mps":
+                    compile_options = {"backend": "aot_eager"}
+                else:
+                    compile_options = {"backend": "inductor", "mode": "reduce-overhead"}
+                self.model.forward = torch.compile(
+                    self.model.forward,
+                    fullgraph=False,
+                    dynamic=False,
+                    **compile_options
+                )
+                self._warm_up()
+                logger.info("⚡ Compiled model forward pass (%s)", compile_options["backend"])
+            except Exception as e:
+                logger.warning("⚠️ torch.compile unavailable, running eager: %s", e)
+    
+    def _warm_up(self):
+        """Run one short generation so compilation happens before the first request"""
+        import copy
+        
+        warm_up_config = copy.deepcopy(self.generation_config)
+        warm_up_config.max_new_tokens = 4
+        inputs = self.tokenizer("Hello", return_tensors="pt")
+        self._generate_batch([(inputs["input_ids"], inputs["attention_mask"], warm_up_config, None, None, None)])
+    
+    def _start_batcher(self):
+        """Start the worker thread that serves queued generations"""
+        if self._batcher_thread is None:
+            self._batcher_thread = threading.Thread(target=self._batch_worker, name="generate-batcher", daemon=True)
+            self._batcher_thread.start()
+    
+    def _batch_worker(self):
+        """Collect queued requests for up to batch_window_ms and generate them together"""
+        while True:
+            item = self._request_queue.get()
+            if item is None:
+                return  # close(); returning releases the thread's reference to self
+            batch = [item]
+            deadline = time.monotonic() + self.config.batch_window_ms / 1000
+            while len(batch) < self.config.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._request_queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._request_queue.put(None)  # Serve this batch first, then stop
+                    break
+                batch.append(item)
+            
+            # Requests can share a generate() call when their generation settings match;
+            # compare by value, since callers often build a fresh config per request.
+            # A streamer only follows one sequence, so streamed requests run alone.
+            groups = {}
+            for item in batch:
+                key = id(item) if item[4] is not None else item[2].to_json_string(use_diff=True)
+                groups.setdefault(key, []).append(item)
+            
+            for group in groups.values():
+                try:
+                    results = self._generate_batch(group)
+                except Exception as e:
+                    for *_, streamer, future in group:
+                        if streamer is not None:
+                            streamer.end()
+                        future.set_exception(e)
+                else:
+                    for (*_, future), result in zip(group, results):
+                        future.set_result(result)
+    
+    def close(self):
+        """Stop the batching worker and tokenizer thread so the model and caches can be freed"""
+        with self.model_lock:
+            if self._batcher_thread is not None:
+                self._request_queue.put(None)
+                self._batcher_thread = None
+            self._tokenizer_pool.shutdown(wait=False, cancel_futures=True)
+            self.is_loaded = False
+    
+    def _generate_batch(self, group: List[Tuple]) -> List[Tuple[str, int]]:
+        """Run one generate() call over left-padded requests; returns (text, new token count) per row"""
+        import torch
+        import torch.nn.functional as F
+        
+        pad_token_id = self.tokenizer.pad_token_id
+        gen_config = group[0][2]
+        
+        # A single request can resume from the previous turn's or its system prompt's
+        # cached KV; padding would shift the prefix positions, so this path runs unpadded
+        past_key_values = None
+        resumable = self.config.use_prefix_cache and len(group) == 1
+        if resumable:
+            input_ids, attention_mask, _, system_prompt, *_ = group[0]
+            past_key_values = self._resume_conversation(input_ids) or self._cached_prefix(system_prompt, input_ids)
+        
+        if past_key_values is not None:
+            prompt_len = input_ids.shape[1]
+            input_ids = input_ids.to(self.device, non_blocking=True)
+            attention_mask = attention_mask.to(self.device, non_blocking=True)
+            self._prefill_in_chunks(input_ids, attention_mask, past_key_values)
+        else:
+            # Left-pad to a fixed bucket so compiled graphs are reused across prompt lengths
+            longest = max(input_ids.shape[1] for input_ids, *_ in group)
+            prompt_len = min(self.config.max_input_tokens, padding_bucket(longest))
+            if prompt_len not in self._compiled_buckets:
+                self._compiled_buckets.add(prompt_len)
+                logger.debug("🧩 New input bucket: %s tokens", prompt_len)
+            input_ids = torch.cat([
+                F.pad(ids, (prompt_len - ids.shape[1], 0), value=pad_token_id) for ids, *_ in group
+            ]).to(self.device, non_blocking=True)
+            attention_mask = torch.cat([
+                F.pad(mask, (prompt_len - mask.shape[1], 0), value=0) for _, mask, *_ in group
+            ]).to(self.device, non_blocking=True)
+            
+            # The pre-allocated static cache holds a single sequence; batches let generate() allocate
+            past_key_values = self.past_key_values if len(group) == 1 else None
+            if past_key_values is not None:
+                # Cache tensors are allocated as inference tensors, so clear them in the same mode
+                with torch.inference_mode():
+                    past_key_values.reset()
+        
+        # Prompt lookup decoding needs a single sequence and a dynamic cache
+        generate_kwargs = {"streamer": group[0][4]} if group[0][4] is not None else {}
+        static_cache = past_key_values is not None and past_key_values is self.past_key_values
+        if gen_config.prompt_lookup_num_tokens and (len(group) > 1 or static_cache):
+            generate_kwargs["prompt_lookup_num_tokens"] = None
+        
+        # Generate without autograd bookkeeping; keep stray fp32 ops in half precision on accelerators
+        use_autocast = self.device.type in ("mps", "cuda") and self.model.dtype != torch.float32
+        with torch.inference_mode(), torch.autocast(device_type=self.device.type, dtype=self.model.dtype, enabled=use_autocast):
+            outputs = self.model.generate(
+                input_ids=input_ids,
+                attention_mask=attention_mask,
+                generation_config=gen_config,
+                past_key_values=past_key_values,
+                use_cache=True,
+                output_scores=False,
+                return_dict_in_generate=False,
+                **generate_kwargs
+            )
+        
+        # generate() extended the cache in place; keep it for the conversation's next turn
+        if resumable:
+            scales = self._park_kv(past_key_values) if self.config.quantize_parked_kv else None
+            self._conversation_kv = (outputs[0].cpu(), past_key_values, scales)
+        
+        # Decode response; finished rows are padded out to the longest generation
+        new_tokens = outputs[:, prompt_len:]
+        texts = self.tokenizer.batch_decode(new_tokens, skip_special_tokens=True)
+        token_counts = (new_tokens != pad_token_id).sum(dim=1).tolist()
+        return list(zip(texts, token_counts))
+    
+    def _system_prompt_ids(self, system_prompt: str) -> Tuple[object, bool]:
+        """Token ids of a templated system prompt, and whether the rest of a chat can be appended to them"""
+        import torch
+        
+        entry = self._system_ids.get(system_prompt)
+        if entry is not None:
+            self._system_ids.move_to_end(system_prompt)
+            return entry
+        
+        # Only split if templating the turns separately matches templating them together;
+        # templates that add a BOS token or rewrite the first message do not
+        system = [{"role": "system", "content": system_prompt}]
+        probe = [{"role": "user", "content": "Hello"}]
+        prefix_ids = self.tokenizer.apply_chat_template(system, tokenize=True, return_tensors="pt", return_dict=True)["input_ids"]
+        rest_ids = self.tokenizer.apply_chat_template(probe, tokenize=True, add_generation_prompt=True, return_tensors="pt", return_dict=True)["input_ids"]
+        whole_ids = self.tokenizer.apply_chat_template(system + probe, tokenize=True, add_generation_prompt=True, return_tensors="pt", return_dict=True)["input_ids"]
+        entry = (prefix_ids, torch.equal(torch.cat([prefix_ids, rest_ids], dim=1), whole_ids))
+        
+        self._system_ids[system_prompt] = entry
+        if len(self._system_ids) > self.config.prefix_cache_size:
+            self._system_ids.popitem(last=False)
+        return entry
+    
+    def _tokenize_chat(self, messages: List[LLMMessage]) -> Dict:
+        """Template and tokenize a conversation, reusing the cached ids of its system prompt"""
+        import torch
+        
+        chat = [{"role": msg.role, "content": msg.content} for msg in messages]
+        if len(chat) > 1 and chat[0]["role"] == "system":
+            prefix_ids, splittable = self._system_prompt_ids(chat[0]["content"])
+            if splittable:
+                rest_ids = self.tokenizer.apply_chat_template(
+                    chat[1:], tokenize=True, add_generation_prompt=True, return_tensors="pt", return_dict=True
+                )["input_ids"]
+                # Truncate from the left, as the tokenizer would
+                input_ids = torch.cat([prefix_ids, rest_ids], dim=1)[:, -self.config.max_input_tokens:]
+                return {"input_ids": input_ids, "attention_mask": torch.ones_like(input_ids)}
+        
+        return self.tokenizer.apply_chat_template(
+            chat,
+            tokenize=True,
+            add_generation_prompt=True,
+            return_tensors="pt",
+            return_dict=True,
+            padding=True,
+            truncation=True,
+            max_length=self.config.max_input_tokens  # Reduced for smaller models
+        )
+    
+    def _resume_conversation(self, input_ids) -> Optional[object]:
+        """Previous turn's KV cache cropped to the tokens it shares with input_ids"""
+        import torch
+        
+        if self._conversation_kv is None:
+            return None
+        
+        # The cache is handed over, not copied; it is stored again after generation
+        token_ids, cache, scales = self._conversation_kv
+        self._conversation_kv = None
+        if scales is not None:
+            self._unpark_kv(cache, scales)
+        
+        # Leave at least one prompt token uncached so generate() has something to run
+        limit = min(token_ids.shape[0], input_ids.shape[1] - 1, cache.get_seq_length())
+        mismatches = (token_ids[:limit] != input_ids[0, :limit]).nonzero()
+        shared = mismatches[0].item() if len(mismatches) else limit
+        if shared == 0:
+            return None
+        
+        # A negative length drops that many trailing tokens
+        stale = cache.get_seq_length() - shared
+        if stale:
+            with torch.inference_mode():
+                cache.crop(-stale)
+        return cache
+    
+    def _prefill_in_chunks(self, input_ids, attention_mask, cache):
+        """Extend cache over all but the last prompt token, at most prefill_chunk_size tokens per pass"""
+        import torch
+        
+        chunk_size = self.config.prefill_chunk_size
+        start = cache.get_seq_length()
+        end = input_ids.shape[1] - 1
+        if end - start <= chunk_size:
+            return
+        
+        # Bounds the attention working set of a long new turn; generate() then runs the last token
+        with torch.inference_mode():
+            for position in range(start, end, chunk_size):
+                stop = min(position + chunk_size, end)
+                self.model(
+                    input_ids[:, position:stop],
+                    attention_mask=attention_mask[:, :stop],
+                    past_key_values=cache,
+                    use_cache=True
+                )
+    
+    def _park_kv(self, cache) -> Dict[int, Tuple[float, float, object]]:
+        """Quantize cached keys/values to per-tensor symmetric int8 on CPU, returning the scales and original dtype"""
+        import torch
+        
+        scales = {}
+        with torch.inference_mode():
+            # The first layers are the most sensitive to quantization error
+            for index, layer in enumerate(cache.layers[KV_PARK_FIRST_LAYER:], start=KV_PARK_FIRST_LAYER):
+                # Not every layer class records its dtype, so it is kept alongside the scales
+                dtype = layer.keys.dtype
+                key_scale = layer.keys.abs().amax().clamp(min=1e-8) / 127
+                value_scale = layer.values.abs().amax().clamp(min=1e-8) / 127
+                layer.keys = (layer.keys / key_scale).round().to(device="cpu", dtype=torch.int8)
+                layer.values = (layer.values / value_scale).round().to(device="cpu", dtype=torch.int8)
+                scales[index] = (key_scale.item(), value_scale.item(), dtype)
+        return scales
+    
+    def _unpark_kv(self, cache, scales: Dict[int, Tuple[float, float, object]]):
+        """Dequantize a parked cache back onto the model device"""
+        import torch
+        
+        with torch.inference_mode():
+            for index, (key_scale, value_scale, dtype) in scales.items():
+                layer = cache.layers[index]
+                layer.keys = layer.keys.to(device=self.device, dtype=dtype) * key_scale
+                layer.values = layer.values.to(device=self.device, dtype=dtype) * value_scale
+    
+    def _cached_prefix(self, system_prompt: Optional[str], input_ids) -> Optional[object]:
+        """Copy of the KV cache for a system prompt, prefilled on first use; None if it does not prefix input_ids"""
+        import copy
+        import torch
+        
+        if system_prompt is None:
+            return None
+        
+        entry = self._prefix_kv.get(system_prompt)
+        if entry is None:
+            prefix_ids, _ = self._tokenizer_pool.submit(self._system_prompt_ids, system_prompt).result()
+            with torch.inference_mode():
+                cache = self.model(prefix_ids.to(self.device), use_cache=True).past_key_values
+            entry = (prefix_ids, cache)
+            self._prefix_kv[system_prompt] = entry
+            self._prefix_kv_tokens += prefix_ids.shape[1]
+            
+            # KV memory grows with prompt length, so evict by token budget as well as entry count
+            while len(self._prefix_kv) > 1 and (
+                len(self._prefix_kv) > self.config.prefix_cache_size
+                or self._prefix_kv_tokens > self.config.prefix_cache_tokens
+            ):
+                evicted_ids, _ = self._prefix_kv.popitem(last=False)[1]
+                self._prefix_kv_tokens -= evicted_ids.shape[1]
+        else:
+            self._prefix_kv.move_to_end(system_prompt)
+        
+        # Left truncation or a template that merges across the boundary breaks the prefix
+        prefix_ids, cache = entry
+        prefix_len = prefix_ids.shape[1]
+        if input_ids.shape[1] <= prefix_len or not torch.equal(input_ids[0, :prefix_len], prefix_ids[0]):
+            return None
+        
+        # generate() extends the cache in place, so each request gets its own copy
+        with torch.inference_mode():
+            return copy.deepcopy(cache)
+    
+    def _update_performance_stats(self, generation_time: float, token_count: int):
+        """Record one generation and refresh the rolling average"""
+        slot = self.performance_stats["total_generations"] % self.STATS_WINDOW
+        self._window_time += generation_time - float(self._gen_times[slot])
+        self._window_tokens += token_count - int(self._gen_tokens[slot])
+        self._gen_times[slot] = generation_time
+        self._gen_tokens[slot] = token_count
+        
+        self.performance_stats["total_generations"] += 1
+        self.performance_stats["total_tokens"] += token_count
+        self.performance_stats["last_generation_time"] = generation_time
+        count = min(self.performance_stats["total_generations"], self.STATS_WINDOW)
+        self.performance_stats["avg_generation_time"] = self._window_time / count
+    
+    def get_perf_snapshot(self) -> Dict:
+        """Constant-time performance summary for the chat hot path"""
+        return {
+            "avg_tokens_per_s": self._window_tokens / self._window_time if self._window_time > 0 else 0.0,
+            "last_turn_ms": self.performance_stats["last_generation_time"] * 1000,
+            "total_turns": self.performance_stats["total_generations"]
+        }
+    
+    def _conversation_key(self, messages: List[LLMMessage]) -> bytes:
+        """Hash a conversation, resuming from the cached state of its system prompt"""
+        start = 0
+        if messages and messages[0].role == "system":
+            system_prompt = messages[0].content
+            prefix = self._prefix_hashers.get(system_prompt)
+            if prefix is None:
+                prefix = prompt_hasher()
+                prefix.update(b"system\0" + system_prompt.encode("utf-8") + b"\0")
+                self._prefix_hashers[system_prompt] = prefix
+            hasher = prefix.copy()
+            start = 1
+        else:
+            hasher = prompt_hasher()
+        
+        for msg in messages[start:]:
+            hasher.update(msg.role.encode("utf-8") + b"\0" + msg.content.encode("utf-8") + b"\0")
+        return hasher.digest()[:16]
+    
+    def _clean_response(self, response: str) -> str:
+        """Cut generated text at the next invented turn and trim an unfinished last sentence"""
+        response = LEADING_ROLE_PATTERN.sub("", response)
+        response = TURN_MARKER_PATTERN.split(response, maxsplit=1)[0]
+        response = REPEATED_SPACE_PATTERN.sub(" ", response)
+        response = BLANK_LINES_PATTERN.sub("\n\n", response).strip()
+        
+        # Keep a cut-off tail rather than returning almost nothing
+        trimmed = UNFINISHED_SENTENCE_PATTERN.sub("", response)
+        return trimmed if len(trimmed) >= 10 else response
+    
+    def generate_stream(
+        self,
+        messages: List[LLMMessage],
+        generation_config: Optional["GenerationConfig"] = None
+    ) -> Iterator[str]:
+        """Yield response text as it is decoded; the fallback system answers in one chunk"""
+        
+        start_time = time.time()
+        
+        if not self.is_loaded and not self.load_model():
+            user_messages = [msg for msg in messages if msg.role == "user"]
+            last_user_message = user_messages[-1].content if user_messages else ""
+            yield self.fallback_generator.generate_response(last_user_message, detect_personality(messages))
+            return
+        
+        from transformers import TextIteratorStreamer
+        
+        gen_config = generation_config or self.generation_config
+        inputs = self._tokenizer_pool.submit(self._tokenize_chat, messages).result()
+        
+        # The batching worker runs streamed requests on their own and feeds the streamer
+        streamer = TextIteratorStreamer(self.tokenizer, skip_prompt=True, skip_special_tokens=True)
+        generation_future = Future()
+        system_prompt = messages[0].content if messages and messages[0].role == "system" else None
+        self._request_queue.put((inputs["input_ids"], inputs["attention_mask"], gen_config, system_prompt, streamer, generation_future))
+        
+        # The stream ends when generation finishes or fails; a failure is raised here
+        yield from streamer
+        _, output_token_count = generation_future.result()
+        
+        processing_time = time.time() - start_time
+        self._update_performance_stats(processing_time, output_token_count)
+        logger.info("✅ Streamed response in %.3fs (%s tokens)", processing_time, output_token_count)
+    
     def generate_response(
         self, 
         messages: List[LLMMessage], 
-        generation_config: Optional[GenerationConfig] = None
+        generation_config: Optional["GenerationConfig"] = None
     ) -> Tuple[str, Dict]:
         """Generate response with advanced features and fallback"""
         
@@ -519,28 +1154,19 @@ class M1OptimizedLLM:
                 user_messages = [msg for msg in messages if msg.role == "user"]
                 last_user_message = user_messages[-1].content if user_messages else ""
                 
-                # Determine personality from messages
-                personality = "helpful_assistant"
-                for msg in messages:
-                    if msg.role == "system" and any(p in msg.content.lower() for p in ["technical", "creative", "business"]):
-                        if "technical" in msg.content.lower():
-                            personality = "technical_expert"
-                        elif "creative" in msg.content.lower():
-                            personality = "creative_partner" 
-                        elif "business" in msg.content.lower():
-                            personality = "business_advisor"
-                        break
-                
                 # Generate fallback response
-                response = self.fallback_generator.generate_response(last_user_message, personality)
+                response = self.fallback_generator.generate_response(last_user_message, detect_personality(messages))
                 
                 processing_time = time.time() - start_time
                 
+                # Approximate word counts without allocating split() lists
+                input_tokens, output_tokens = (text.count(" ") + 1 for text in (last_user_message, response))
+                
                 metadata = {
                     "processing_time": processing_time,
-                    "input_tokens": len(last_user_message.split()),
-                    "output_tokens": len(response.split()),
-                    "total_tokens": len(last_user_message.split()) + len(response.split()),
+                    "input_tokens": input_tokens,
+                    "output_tokens": output_tokens,
+                    "total_tokens": input_tokens + output_tokens,
                     "model_name": "fallback_system",
                     "device": "cpu",
                     "memory_usage": self.memory_optimizer.get_memory_stats(),
@@ -550,38 +1176,29 @@ class M1OptimizedLLM:
                 return response, metadata
         
         try:
-            # Prepare input
-            conversation_text = self._format_conversation(messages)
-            
-            # Tokenize
-            inputs = self.tokenizer(
-                conversation_text,
-                return_tensors="pt",
-                padding=True,
-                truncation=True,
-                max_length=512  # Reduced for smaller models
-            )
-            
-            input_ids = inputs["input_ids"].to(self.device)
-            attention_mask = inputs["attention_mask"].to(self.device)
-            
             # Use custom or default generation config
             gen_config = generation_config or self.generation_config
             
-            # Generate
-            with torch.no_grad():
-                outputs = self.model.generate(
-                    input_ids=input_ids,
-                    attention_mask=attention_mask,
-                    generation_config=gen_config,
-                    use_cache=True,
-                    output_scores=False,
-                    return_dict_in_generate=False
-                )
+            # Greedy decoding is deterministic, so repeated conversations can be served from cache
+            cache_key = None
+            if not gen_config.do_sample and self.config.response_cache_size:
+                cache_key = self._conversation_key(messages)
+                cached = self._response_cache.get(cache_key)
+                if cached is not None:
+                    self._response_cache.move_to_end(cache_key)
+                    response, metadata = cached
+                    return response, {**metadata, "processing_time": time.time() - start_time, "cache_hit": True}
             
-            # Decode response
-            new_tokens = outputs[0][input_ids.shape[1]:]
-            response = self.tokenizer.decode(new_tokens, skip_special_tokens=True)
+            # Tokenize on the tokenizer thread, which keeps concurrent callers from
+            # using the tokenizer at the same time
+            inputs = self._tokenizer_pool.submit(self._tokenize_chat, messages).result()
+            input_token_count = inputs["input_ids"].shape[1]
+            
+            # Hand off to the batching worker, which owns the model
+            generation_future = Future()
+            system_prompt = messages[0].content if messages and messages[0].role == "system" else None
+            self._request_queue.put((inputs["input_ids"], inputs["attention_mask"], gen_config, system_prompt, None, generation_future))
+            response, output_token_count = generation_future.result()
             
             # Clean response
             response = self._clean_response(response)
@@ -591,24 +1208,10 @@ class M1OptimizedLLM:
                 user_messages = [msg for msg in messages if msg.role == "user"]
                 last_user_message = user_messages[-1].content if user_messages else ""
                 
-                # Determine personality
-                personality = "helpful_assistant"
-                for msg in messages:
-                    if msg.role == "system":
-                        if "technical" in msg.content.lower():
-                            personality = "technical_expert"
-                        elif "creative" in msg.content.lower():
-                            personality = "creative_partner"
-                        elif "business" in msg.content.lower():
-                            personality = "business_advisor"
-                        break
-                
-                response = self.fallback_generator.generate_response(last_user_message, personality)
+                response = self.fallback_generator.generate_response(last_user_message, detect_personality(messages))
             
             # Calculate metrics
             processing_time = time.time() - start_time
-            input_token_count = input_ids.shape[1]
-            output_token_count = len(new_tokens) if 'new_tokens' in locals() else len(response.split())
             
             # Update performance stats
             self._update_performance_stats(processing_time, output_token_count)
@@ -631,16 +1234,38 @@ class M1OptimizedLLM:
                 }
             }
             
-            logger.info(f"✅ Generated response in {processing_time:.3f}s ({output_token_count} tokens)")
+            logger.info("✅ Generated response in %.3fs (%s tokens)", processing_time, output_token_count)
+            
+            if cache_key is not None:
+                self._response_cache[cache_key] = (response, metadata)
+                if len(self._response_cache) > self.config.response_cache_size:
+                    self._response_cache.popitem(last=False)
             
             return response, metadata
             
         except Exception as e:
-            logger.error(f"❌ Generation failed: {e}")
+            logger.error("❌ Generation failed: %s", e)
             
             # Fallback response
             user_messages = [msg for msg in messages if msg.role == "user"]
             last_user_message = user_messages[-1].content if user_messages else ""
             
             response = self.fallback_generator.generate_response(last_user_message, "helpful_assistant")
-            processing_time = time.time() - start_time
\ No newline at end of file
+            processing_time = time.time() - start_time
+            
+            # No generated tokens to count on this path; approximate by words
+            output_token_count = response.count(" ") + 1
+            
+            metadata = {
+                "processing_time": processing_time,
+                "input_tokens": 0,
+                "output_tokens": output_token_count,
+                "total_tokens": output_token_count,
+                "model_name": "fallback_system",
+                "device": str(self.device),
+                "memory_usage": self.memory_optimizer.get_memory_stats(),
+                "generation_config": {"fallback": True},
+                "error": str(e)
+            }
+            
+            return response, metadata
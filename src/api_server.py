@@ -6,16 +6,24 @@ Production-ready FastAPI server with advanced features
 from fastapi import FastAPI, HTTPException, BackgroundTasks, Depends, status
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.gzip import GZipMiddleware
-from fastapi.responses import StreamingResponse
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from pydantic import BaseModel, Field, validator
-from typing import List, Dict, Optional, Literal, Union
+from typing import Any, Iterator, List, Dict, Optional, Literal, Tuple, Union
 import asyncio
+import copy
+import heapq
 import uvicorn
 import logging
 from datetime import datetime, timedelta
-import json
+import orjson
 import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from multiprocessing.managers import BaseManager, IteratorProxy
+import multiprocessing
+import os
 import psutil
 import threading
 from pathlib import Path
@@ -25,7 +33,7 @@ import sys
 sys.path.append(str(Path(__file__).parent))
 
 # Import our advanced LLM system
-from advanced_llm import AdvancedChatbot, LLMConfig, LLMMessage
+from advanced_llm import AdvancedChatbot, AdvancedPromptEngineer, LLMConfig, LLMMessage, M1OptimizedLLM
 
 # Configure logging
 logging.basicConfig(
@@ -45,15 +53,24 @@ class AdvancedSessionManager:
         self.session_metadata: Dict[str, Dict] = {}
         self.max_sessions = 100
         self.session_timeout = timedelta(hours=4)
+        # (expiry on the monotonic clock, session_id); one entry per session,
+        # re-pushed lazily when the session turns out to have been active
+        self._expiry_heap: List[Tuple[float, str]] = []
+        # System prompts and techniques for turns built here rather than by AdvancedChatbot
+        self.prompt_engineer = AdvancedPromptEngineer()
+        # One LLM for session-less /chat/compare turns, so they share its batching worker
+        self._shared_llm: Optional[M1OptimizedLLM] = None
+        self._shared_llm_lock = threading.Lock()
         
         # Performance tracking
         self.request_counter = 0
-        self.response_times = []
+        self.response_times = deque(maxlen=1000)
         self.error_counter = 0
+        self.cpu_usage = 0.0
         
-        # Start cleanup task
-        self.cleanup_thread = threading.Thread(target=self._periodic_cleanup, daemon=True)
-        self.cleanup_thread.start()
+        # Sample CPU in the background so /metrics never blocks on psutil
+        self.cpu_thread = threading.Thread(target=self._sample_cpu, daemon=True)
+        self.cpu_thread.start()
         
         logger.info("🚀 Advanced Session Manager initialized")
     
@@ -61,7 +78,7 @@ class AdvancedSessionManager:
         """Create new session with advanced configuration"""
         # Cleanup if needed
         if len(self.sessions) >= self.max_sessions:
-            self._cleanup_old_sessions()
+            self.cleanup_old_sessions()
         
         # Create LLM config
         llm_config = LLMConfig()
@@ -78,11 +95,12 @@ class AdvancedSessionManager:
         self.sessions[session_id] = chatbot
         self.session_metadata[session_id] = {
             "created_at": datetime.now(),
-            "last_activity": datetime.now(),
+            "last_active": time.monotonic(),
             "personality": personality,
             "config": config or {},
             "request_count": 0
         }
+        heapq.heappush(self._expiry_heap, (time.monotonic() + self.session_timeout.total_seconds(), session_id))
         
         logger.info(f"📝 Created session {session_id} with personality {personality}")
         return session_id
@@ -90,32 +108,221 @@ class AdvancedSessionManager:
     def get_session(self, session_id: str) -> Optional[AdvancedChatbot]:
         """Get session and update activity"""
         if session_id in self.sessions:
-            self.session_metadata[session_id]["last_activity"] = datetime.now()
-            self.session_metadata[session_id]["request_count"] += 1
+            metadata = self.session_metadata[session_id]
+            now = time.monotonic()
+            if now - metadata["last_active"] > self.session_timeout.total_seconds():
+                self.delete_session(session_id)
+                return None
+            metadata["last_active"] = now
+            metadata["request_count"] += 1
             return self.sessions[session_id]
         return None
     
-    def _cleanup_old_sessions(self):
-        """Remove expired sessions"""
-        now = datetime.now()
-        expired_sessions = []
+    # Endpoint operations. These take and return plain picklable values so the
+    # manager can also be served to other processes through EngineManager.
+    
+    def get_metadata(self, session_id: str) -> Optional[Dict]:
+        """Get session metadata without touching activity"""
+        return self.session_metadata.get(session_id)
+    
+    def chat(self, session_id: str, user_message: str, prompt_technique: str = "standard",
+             temperature: Optional[float] = None) -> Optional[Tuple[LLMMessage, Dict]]:
+        """Run one chat turn; returns the response message and a performance snapshot"""
+        chatbot = self.get_session(session_id)
+        if not chatbot:
+            return None
+        
+        response_msg = chatbot.chat(
+            user_message=user_message,
+            prompt_technique=prompt_technique,
+            temperature=temperature
+        )
+        return response_msg, self._perf_snapshot(chatbot)
+    
+    @staticmethod
+    def _perf_snapshot(chatbot: AdvancedChatbot) -> Dict:
+        """Constant-time performance summary from the session's LLM"""
+        llm = getattr(chatbot, "llm", None)
+        if llm is not None:
+            return llm.get_perf_snapshot()
+        get_snapshot = getattr(chatbot, "get_perf_snapshot", None)
+        return get_snapshot() if get_snapshot is not None else {}
+    
+    def chat_stream(self, session_id: str, user_message: str, prompt_technique: str = "standard",
+                    temperature: Optional[float] = None) -> Iterator[str]:
+        """Run one chat turn, yielding response text as it is generated"""
+        chatbot = self.get_session(session_id)
+        if not chatbot:
+            return iter(())
+        
+        llm = getattr(chatbot, "llm", None)
+        if llm is None:
+            # Nothing to stream from; send the whole turn as one chunk
+            response_msg = chatbot.chat(
+                user_message=user_message,
+                prompt_technique=prompt_technique,
+                temperature=temperature
+            )
+            return iter((response_msg.content,))
+        
+        personality = self.session_metadata[session_id]["personality"]
+        return self._stream_turn(chatbot, llm, personality, user_message, prompt_technique, temperature)
+    
+    def _stream_turn(self, chatbot: AdvancedChatbot, llm, personality: str, user_message: str,
+                     prompt_technique: str, temperature: Optional[float]) -> Iterator[str]:
+        """Stream one turn from the session's M1OptimizedLLM and record it in the chatbot's history"""
+        messages = self._build_turn(personality, chatbot.messages, user_message, prompt_technique)
+        gen_config = self._generation_config(llm, temperature)
         
+        start_time = time.time()
+        chunks = []
+        for chunk in llm.generate_stream(messages, gen_config):
+            chunks.append(chunk)
+            yield chunk
+        
+        chatbot.messages.append(LLMMessage("user", user_message, prompt_type=prompt_technique))
+        chatbot.messages.append(LLMMessage(
+            "assistant",
+            "".join(chunks),
+            processing_time=time.time() - start_time,
+            model_used=llm.config.model_name,
+            prompt_type=prompt_technique
+        ))
+    
+    def compare_turn(self, personality: str, user_message: str, prompt_technique: str = "standard",
+                     temperature: Optional[float] = None) -> Tuple[LLMMessage, Dict]:
+        """One personality's answer for /chat/compare from the shared LLM, without creating a session"""
+        llm = self._get_shared_llm()
+        messages = self._build_turn(personality, [], user_message, prompt_technique)
+        response, metadata = llm.generate_response(messages, self._generation_config(llm, temperature))
+        response_msg = LLMMessage(
+            "assistant",
+            response,
+            token_count=metadata["output_tokens"],
+            processing_time=metadata["processing_time"],
+            model_used=metadata["model_name"],
+            prompt_type=prompt_technique
+        )
+        return response_msg, llm.get_perf_snapshot()
+    
+    def _get_shared_llm(self) -> M1OptimizedLLM:
+        """The LLM shared by session-less turns, created on first use"""
+        with self._shared_llm_lock:
+            if self._shared_llm is None:
+                self._shared_llm = M1OptimizedLLM(LLMConfig())
+            return self._shared_llm
+    
+    def _build_turn(self, personality: str, history: List[LLMMessage], user_message: str,
+                    prompt_technique: str) -> List[LLMMessage]:
+        """Personality system prompt, prior turns and the technique-wrapped user message"""
+        system_prompt = self.prompt_engineer.personality_prompts.get(personality, {}).get("system_prompt")
+        prompt = user_message
+        if prompt_technique != "standard":
+            prompt = self.prompt_engineer.apply_technique(user_message, prompt_technique, personality)
+        messages = [LLMMessage("system", system_prompt)] if system_prompt else []
+        messages += [msg for msg in history if msg.role != "system"]
+        messages.append(LLMMessage("user", prompt, prompt_type=prompt_technique))
+        return messages
+    
+    @staticmethod
+    def _generation_config(llm: M1OptimizedLLM, temperature: Optional[float]):
+        """The LLM's default generation config, or a copy of it at the requested temperature"""
+        if temperature is None or not llm.load_model():
+            return None
+        gen_config = copy.deepcopy(llm.generation_config)
+        gen_config.temperature = temperature
+        return gen_config
+    
+    def get_analysis(self, session_id: str) -> Optional[Dict]:
+        """Get detailed conversation analysis"""
+        chatbot = self.get_session(session_id)
+        return chatbot.get_conversation_analysis() if chatbot else None
+    
+    def list_sessions(self) -> List[Dict]:
+        """Summaries of all active sessions"""
+        sessions_info = []
+        wall_offset = time.time() - time.monotonic()
         for session_id, metadata in self.session_metadata.items():
-            if now - metadata["last_activity"] > self.session_timeout:
-                expired_sessions.append(session_id)
+            chatbot = self.sessions.get(session_id)
+            if chatbot:
+                sessions_info.append({
+                    "session_id": session_id,
+                    "personality": metadata["personality"],
+                    "created_at": metadata["created_at"].isoformat(),
+                    "last_activity": datetime.fromtimestamp(metadata["last_active"] + wall_offset).isoformat(),
+                    "request_count": metadata["request_count"],
+                    "message_count": len(chatbot.messages)
+                })
+        return sessions_info
+    
+    def delete_session(self, session_id: str) -> bool:
+        """Delete a session; False if it does not exist"""
+        chatbot = self.sessions.pop(session_id, None)
+        if chatbot is None:
+            return False
+        self.session_metadata.pop(session_id, None)
+        self._release(chatbot)
+        return True
+    
+    def clear_sessions(self) -> int:
+        """Delete all sessions, returning how many there were"""
+        chatbots = list(self.sessions.values())
+        self.sessions.clear()
+        self.session_metadata.clear()
+        self._expiry_heap.clear()
+        for chatbot in chatbots:
+            self._release(chatbot)
+        return len(chatbots)
+    
+    @staticmethod
+    def _release(chatbot: AdvancedChatbot):
+        """Stop the threads of a removed session's LLM so its model can be freed"""
+        # Each AdvancedChatbot owns an M1OptimizedLLM, kept as .llm
+        llm = getattr(chatbot, "llm", None)
+        if llm is not None:
+            llm.close()
+    
+    def record_request(self, response_time: float, success: bool = True):
+        """Track request metrics"""
+        self.request_counter += 1
+        self.response_times.append(response_time)
+        
+        if not success:
+            self.error_counter += 1
+    
+    def cleanup_old_sessions(self):
+        """Remove expired sessions"""
+        now = time.monotonic()
+        timeout = self.session_timeout.total_seconds()
+        expired_count = 0
         
-        for session_id in expired_sessions:
-            self.sessions.pop(session_id, None)
-            self.session_metadata.pop(session_id, None)
+        while self._expiry_heap and self._expiry_heap[0][0] <= now:
+            _, session_id = heapq.heappop(self._expiry_heap)
+            metadata = self.session_metadata.get(session_id)
+            if metadata is None:
+                continue  # Already deleted
+            
+            expires_at = metadata["last_active"] + timeout
+            if expires_at > now:
+                heapq.heappush(self._expiry_heap, (expires_at, session_id))
+                continue
+            
+            self.delete_session(session_id)
+            expired_count += 1
         
-        if expired_sessions:
-            logger.info(f"🧹 Cleaned up {len(expired_sessions)} expired sessions")
+        if expired_count:
+            logger.info(f"🧹 Cleaned up {expired_count} expired sessions")
     
-    def _periodic_cleanup(self):
-        """Periodic cleanup thread"""
+    def _sample_cpu(self):
+        """CPU sampler thread; each reading covers the time since the previous one"""
+        psutil.cpu_percent(interval=None)
         while True:
-            time.sleep(1800)  # Run every 30 minutes
-            self._cleanup_old_sessions()
+            time.sleep(2)
+            self.cpu_usage = psutil.cpu_percent(interval=None)
+    
+    def get_cpu_usage(self) -> float:
+        """Latest sampled CPU usage percentage"""
+        return self.cpu_usage
     
     def get_stats(self) -> Dict:
         """Get session manager statistics"""
@@ -135,22 +342,78 @@ class AdvancedSessionManager:
             distribution[personality] = distribution.get(personality, 0) + 1
         return distribution
 
+class EngineManager(BaseManager):
+    """Serves one process's session manager to every uvicorn worker"""
+
+# Streamed chat turns are iterated from the workers through a proxy
+EngineManager.register("Iterator", proxytype=IteratorProxy, create_method=False)
+
+# With API_WORKERS > 1, a single inference engine process owns the models and
+# sessions; the uvicorn workers only handle HTTP and forward calls to it
+API_WORKERS = int(os.getenv("API_WORKERS", "1"))
+ENGINE_ADDRESS = (os.getenv("ENGINE_HOST", "127.0.0.1"), int(os.getenv("ENGINE_PORT", "50055")))
+ENGINE_AUTHKEY = os.getenv("ENGINE_AUTHKEY", "ai-chatbot-pro").encode()
+
+def connect_to_engine(attempts: int = 50):
+    """Get a proxy to the engine's session manager, waiting for the engine to start"""
+    EngineManager.register("session_manager")
+    manager = EngineManager(address=ENGINE_ADDRESS, authkey=ENGINE_AUTHKEY)
+    for attempt in range(attempts):
+        try:
+            manager.connect()
+            break
+        except ConnectionRefusedError:
+            if attempt == attempts - 1:
+                raise
+            time.sleep(0.2)
+    return manager.session_manager()
+
+def serve_engine():
+    """Inference engine process: serve the local session manager until killed"""
+    EngineManager.register(
+        "session_manager", callable=lambda: session_manager, method_to_typeid={"chat_stream": "Iterator"}
+    )
+    server = EngineManager(address=ENGINE_ADDRESS, authkey=ENGINE_AUTHKEY).get_server()
+    logger.info(f"🧠 Inference engine listening on {ENGINE_ADDRESS[0]}:{ENGINE_ADDRESS[1]}")
+    server.serve_forever()
+
 # Initialize session manager
-session_manager = AdvancedSessionManager()
+if os.getenv("INFERENCE_ENGINE") == "remote":
+    session_manager = connect_to_engine()
+else:
+    session_manager = AdvancedSessionManager()
+
+# Threads for blocking chat calls. The model itself is only driven by the LLM's
+# batching worker, so these threads just wait on it and can safely outnumber it.
+CHAT_THREADS = int(os.getenv("CHAT_THREADS", "16"))
+
+async def periodic_cleanup():
+    """Expire idle sessions every 30 minutes"""
+    while True:
+        await asyncio.sleep(1800)
+        try:
+            await asyncio.to_thread(session_manager.cleanup_old_sessions)
+        except Exception as e:
+            logger.error(f"Session cleanup failed: {e}")
 
 # Lifespan event handler
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
     logger.info("🚀 Starting Advanced M1-Optimized AI API Server")
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(max_workers=CHAT_THREADS, thread_name_prefix="chat")
+    )
     system_info = {
         "cpu_cores": psutil.cpu_count(),
         "memory_gb": psutil.virtual_memory().total / (1024**3),
         "platform": "M1 MacBook Pro"
     }
     logger.info(f"💻 System: {system_info}")
+    cleanup_task = asyncio.create_task(periodic_cleanup())
     yield
     # Shutdown
+    cleanup_task.cancel()
     logger.info("🛑 Shutting down API server")
 
 # Initialize FastAPI
@@ -160,6 +423,7 @@ app = FastAPI(
     version="2.0.0",
     docs_url="/docs",
     redoc_url="/redoc",
+    default_response_class=ORJSONResponse,
     lifespan=lifespan
 )
 
@@ -181,11 +445,13 @@ class ChatRequest(BaseModel):
     prompt_technique: Literal["standard", "chain_of_thought", "few_shot", "role_playing", "socratic", "step_by_step"] = "standard"
     temperature: Optional[float] = Field(None, ge=0.1, le=2.0)
     max_tokens: Optional[int] = Field(None, ge=50, le=500)
-    advanced_config: Optional[Dict] = None
+    advanced_config: Optional[Dict[str, Any]] = None
 
-class ChatResponse(BaseModel):
+# Built by the server itself, so a dataclass skips Pydantic validation; orjson serializes it natively
+@dataclass(slots=True)
+class ChatResponse:
     response: str
-    session_id: str
+    session_id: Optional[str]  # None for /chat/compare, which keeps no session
     personality: str
     prompt_technique: str
     metadata: Dict
@@ -217,15 +483,7 @@ class ConversationAnalysis(BaseModel):
 # Request tracking
 def track_request(response_time: float, success: bool = True):
     """Track request metrics"""
-    session_manager.request_counter += 1
-    session_manager.response_times.append(response_time)
-    
-    if not success:
-        session_manager.error_counter += 1
-    
-    # Keep only last 1000 response times
-    if len(session_manager.response_times) > 1000:
-        session_manager.response_times = session_manager.response_times[-1000:]
+    session_manager.record_request(response_time, success)
 
 # API Endpoints
 @app.get("/")
@@ -260,10 +518,11 @@ async def get_metrics():
     """Get comprehensive system metrics"""
     # System metrics
     memory = psutil.virtual_memory()
-    cpu_percent = psutil.cpu_percent(interval=1)
-    
-    # API stats
-    api_stats = session_manager.get_stats()
+    # Both are IPC round-trips when sessions live in the engine process
+    cpu_percent, api_stats = await asyncio.gather(
+        asyncio.to_thread(session_manager.get_cpu_usage),
+        asyncio.to_thread(session_manager.get_stats)
+    )
     
     return SystemMetrics(
         cpu_usage=cpu_percent,
@@ -274,16 +533,16 @@ async def get_metrics():
             "percent": memory.percent
         },
         api_stats=api_stats,
-        active_sessions=len(session_manager.sessions),
-        uptime=str(timedelta(seconds=int(time.time() - session_manager.request_counter)))
+        active_sessions=api_stats["active_sessions"],
+        uptime=str(timedelta(seconds=int(time.time() - api_stats["total_requests"])))
     )
 
 @app.post("/sessions", response_model=SessionResponse)
 async def create_session(request: SessionCreateRequest):
     """Create new chat session"""
     try:
-        session_id = session_manager.create_session(request.personality, request.config)
-        metadata = session_manager.session_metadata[session_id]
+        session_id = await asyncio.to_thread(session_manager.create_session, request.personality, request.config)
+        metadata = await asyncio.to_thread(session_manager.get_metadata, session_id)
         
         return SessionResponse(
             session_id=session_id,
@@ -295,7 +554,7 @@ async def create_session(request: SessionCreateRequest):
         logger.error(f"Session creation failed: {e}")
         raise HTTPException(status_code=500, detail=f"Session creation failed: {str(e)}")
 
-@app.post("/chat", response_model=ChatResponse)
+@app.post("/chat", responses={200: {"model": ChatResponse}})
 async def chat(
     request: ChatRequest,
     background_tasks: BackgroundTasks
@@ -305,21 +564,17 @@ async def chat(
     
     try:
         # Get or create session
-        if request.session_id:
-            chatbot = session_manager.get_session(request.session_id)
-            if not chatbot:
-                raise HTTPException(status_code=404, detail="Session not found")
-            session_id = request.session_id
-        else:
-            session_id = session_manager.create_session(request.personality, request.advanced_config)
-            chatbot = session_manager.get_session(session_id)
+        session_id = request.session_id or await asyncio.to_thread(
+            session_manager.create_session, request.personality, request.advanced_config
+        )
         
-        # Generate response
-        response_msg = chatbot.chat(
-            user_message=request.message,
-            prompt_technique=request.prompt_technique,
-            temperature=request.temperature
+        # Generate response off the event loop
+        result = await asyncio.to_thread(
+            session_manager.chat, session_id, request.message, request.prompt_technique, request.temperature
         )
+        if result is None:
+            raise HTTPException(status_code=404, detail="Session not found")
+        response_msg, performance = result
         
         # Calculate response time
         response_time = time.time() - start_time
@@ -327,10 +582,8 @@ async def chat(
         # Track metrics in background
         background_tasks.add_task(track_request, response_time, True)
         
-        # Get conversation analysis
-        analysis = chatbot.get_conversation_analysis()
-        
-        return ChatResponse(
+        # Serialize directly; skips response_model validation and jsonable_encoder
+        return ORJSONResponse(ChatResponse(
             response=response_msg.content,
             session_id=session_id,
             personality=request.personality,
@@ -343,9 +596,9 @@ async def chat(
                 "confidence_score": response_msg.confidence_score,
                 "api_response_time": response_time
             },
-            performance=analysis["performance"],
+            performance=performance,
             timestamp=response_msg.timestamp
-        )
+        ))
         
     except HTTPException:
         raise
@@ -354,97 +607,114 @@ async def chat(
         background_tasks.add_task(track_request, time.time() - start_time, False)
         raise HTTPException(status_code=500, detail=f"Chat processing failed: {str(e)}")
 
+@app.post("/chat/stream")
+async def chat_stream(request: ChatRequest):
+    """Stream the response as Server-Sent Events while it is generated"""
+    session_id = request.session_id or await asyncio.to_thread(
+        session_manager.create_session, request.personality, request.advanced_config
+    )
+    if await asyncio.to_thread(session_manager.get_metadata, session_id) is None:
+        raise HTTPException(status_code=404, detail="Session not found")
+    
+    stream = await asyncio.to_thread(
+        session_manager.chat_stream, session_id, request.message, request.prompt_technique, request.temperature
+    )
+    
+    async def events():
+        start_time = time.time()
+        success = True
+        try:
+            # Each chunk blocks on the generation thread, so pull them off the event loop
+            while (token := await asyncio.to_thread(next, stream, None)) is not None:
+                yield b"data: " + orjson.dumps({"token": token}) + b"\n\n"
+            yield b"data: " + orjson.dumps({"done": True, "session_id": session_id}) + b"\n\n"
+        except Exception as e:
+            success = False
+            logger.error(f"Chat stream error: {e}")
+            yield b"data: " + orjson.dumps({"error": str(e)}) + b"\n\n"
+        finally:
+            await asyncio.to_thread(track_request, time.time() - start_time, success)
+    
+    # GZip skips event streams; also keep reverse proxies from buffering them
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.get("/sessions", response_model=List[Dict])
 async def list_sessions():
     """List all active sessions"""
-    sessions_info = []
-    for session_id, metadata in session_manager.session_metadata.items():
-        chatbot = session_manager.sessions.get(session_id)
-        if chatbot:
-            sessions_info.append({
-                "session_id": session_id,
-                "personality": metadata["personality"],
-                "created_at": metadata["created_at"].isoformat(),
-                "last_activity": metadata["last_activity"].isoformat(),
-                "request_count": metadata["request_count"],
-                "message_count": len(chatbot.messages)
-            })
-    return sessions_info
+    return await asyncio.to_thread(session_manager.list_sessions)
 
 @app.get("/session/{session_id}/analysis", response_model=ConversationAnalysis)
 async def get_conversation_analysis(session_id: str):
     """Get detailed conversation analysis"""
-    chatbot = session_manager.get_session(session_id)
-    if not chatbot:
+    analysis = await asyncio.to_thread(session_manager.get_analysis, session_id)
+    if analysis is None:
         raise HTTPException(status_code=404, detail="Session not found")
     
-    analysis = chatbot.get_conversation_analysis()
-    
     return ConversationAnalysis(
         session_id=session_id,
         analysis=analysis,
         export_timestamp=datetime.now()
     )
 
-@app.post("/chat/compare", response_model=Dict[str, ChatResponse])
+@app.post("/chat/compare", responses={200: {"model": Dict[str, ChatResponse]}})
 async def compare_personalities(request: ChatRequest):
     """Compare responses across all personalities"""
     personalities = ["helpful_assistant", "technical_expert", "creative_partner", "business_advisor", "learning_tutor"]
-    responses = {}
     
-    for personality in personalities:
-        try:
-            # Create temporary session for comparison
-            temp_session_id = session_manager.create_session(personality)
-            temp_chatbot = session_manager.get_session(temp_session_id)
-            
-            # Generate response
-            response_msg = temp_chatbot.chat(
-                user_message=request.message,
-                prompt_technique=request.prompt_technique,
-                temperature=request.temperature or 0.7
-            )
-            
-            # Get analysis
-            analysis = temp_chatbot.get_conversation_analysis()
-            
-            responses[personality] = ChatResponse(
-                response=response_msg.content,
-                session_id=temp_session_id,
-                personality=personality,
-                prompt_technique=request.prompt_technique,
-                metadata={
-                    "processing_time": response_msg.processing_time,
-                    "token_count": response_msg.token_count,
-                    "model_used": response_msg.model_used
-                },
-                performance=analysis["performance"],
-                timestamp=response_msg.timestamp
-            )
-            
-        except Exception as e:
-            logger.error(f"Comparison failed for {personality}: {e}")
+    def compare_one(personality: str) -> ChatResponse:
+        response_msg, performance = session_manager.compare_turn(
+            personality,
+            request.message,
+            request.prompt_technique,
+            request.temperature or 0.7
+        )
+        
+        return ChatResponse(
+            response=response_msg.content,
+            session_id=None,
+            personality=personality,
+            prompt_technique=request.prompt_technique,
+            metadata={
+                "processing_time": response_msg.processing_time,
+                "token_count": response_msg.token_count,
+                "model_used": response_msg.model_used
+            },
+            performance=performance,
+            timestamp=response_msg.timestamp
+        )
+    
+    # All personalities go to one shared LLM at once; its batching worker left-pads the
+    # prompts that arrive within batch_window_ms into a single generate() call
+    results = await asyncio.gather(
+        *(asyncio.to_thread(compare_one, personality) for personality in personalities),
+        return_exceptions=True
+    )
+    
+    responses = {}
+    for personality, result in zip(personalities, results):
+        if isinstance(result, Exception):
+            logger.error(f"Comparison failed for {personality}: {result}")
             continue
+        responses[personality] = result
     
-    return responses
+    return ORJSONResponse(responses)
 
 @app.delete("/session/{session_id}")
 async def delete_session(session_id: str):
     """Delete specific session"""
-    if session_id not in session_manager.sessions:
+    if not await asyncio.to_thread(session_manager.delete_session, session_id):
         raise HTTPException(status_code=404, detail="Session not found")
     
-    session_manager.sessions.pop(session_id, None)
-    session_manager.session_metadata.pop(session_id, None)
-    
     return {"message": f"Session {session_id} deleted successfully"}
 
 @app.delete("/sessions")
 async def clear_all_sessions():
     """Clear all sessions (admin operation)"""
-    session_count = len(session_manager.sessions)
-    session_manager.sessions.clear()
-    session_manager.session_metadata.clear()
+    session_count = await asyncio.to_thread(session_manager.clear_sessions)
     
     return {"message": f"Cleared {session_count} sessions successfully"}
 
@@ -500,8 +770,7 @@ async def run_benchmark():
     start_time = time.time()
     
     # Create test session
-    session_id = session_manager.create_session("helpful_assistant")
-    chatbot = session_manager.get_session(session_id)
+    session_id = await asyncio.to_thread(session_manager.create_session, "helpful_assistant")
     
     # Benchmark tests
     test_cases = [
@@ -515,10 +784,7 @@ async def run_benchmark():
     results = []
     for test in test_cases:
         test_start = time.time()
-        response = chatbot.chat(
-            user_message=test["message"],
-            prompt_technique=test["technique"]
-        )
+        response, _ = await asyncio.to_thread(session_manager.chat, session_id, test["message"], test["technique"])
         test_time = time.time() - test_start
         
         results.append({
@@ -556,12 +822,27 @@ if __name__ == "__main__":
     print("⚡ Optimized for M1 MacBook Pro with Metal acceleration")
     print("=" * 60)
     
-    uvicorn.run(
-        "api_server:app",
-        host="0.0.0.0",
-        port=8000,
-        reload=True,
-        reload_dirs=["./"],
-        log_level="info",
-        access_log=True
-    )
\ No newline at end of file
+    if API_WORKERS > 1:
+        # Workers are spawned fresh and inherit this environment, so they connect
+        # to the engine instead of building their own session manager
+        engine = multiprocessing.Process(target=serve_engine, name="inference-engine", daemon=True)
+        engine.start()
+        os.environ["INFERENCE_ENGINE"] = "remote"
+        uvicorn.run(
+            "api_server:app",
+            host="0.0.0.0",
+            port=8000,
+            workers=API_WORKERS,
+            log_level="info",
+            access_log=True
+        )
+    else:
+        uvicorn.run(
+            "api_server:app",
+            host="0.0.0.0",
+            port=8000,
+            reload=True,
+            reload_dirs=["./"],
+            log_level="info",
+            access_log=True
+        )
\ No newline at end of file
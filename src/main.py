@@ -11,11 +11,14 @@ from pathlib import Path
 # Add src to path
 sys.path.append(str(Path(__file__).parent))
 
-import torch
+import hashlib
+import io
 import logging
+import mmap
 from datetime import datetime
-import asyncio
-from typing import Dict, List, Optional
+from functools import cache
+from types import MappingProxyType
+from typing import Mapping
 
 # Configure logging
 logging.basicConfig(
@@ -24,6 +27,29 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+@cache
+def _probe_system() -> Mapping:
+    """Probe the hardware once; architecture, memory and MPS support are fixed for the process"""
+    import platform
+    import psutil
+    import torch
+    
+    mps_available = torch.backends.mps.is_available()
+    return MappingProxyType({
+        "architecture": platform.machine(),
+        "mps_available": mps_available,
+        "device": "mps" if mps_available else "cpu",
+        "memory_gb": psutil.virtual_memory().total / (1024**3),
+        "cpu_cores": psutil.cpu_count()
+    })
+
+@cache
+def _torch_device() -> "torch.device":
+    """Device picked from the cached probe, built once"""
+    import torch
+    
+    return torch.device(_probe_system()["device"])
+
 class M1SystemInfo:
     """M1 MacBook Pro system information and optimization"""
     
@@ -32,12 +58,11 @@ class M1SystemInfo:
     
     def check_m1_optimization(self):
         """Verify M1 optimization"""
-        import platform
-        import psutil
+        info = _probe_system()
         
         # Check architecture
-        arch = platform.machine()
-        logger.info(f"System Architecture: {arch}")
+        arch = info["architecture"]
+        logger.info("System Architecture: %s", arch)
         
         if arch != 'arm64':
             logger.warning("⚠️ Not running on ARM64 architecture")
@@ -45,31 +70,24 @@ class M1SystemInfo:
             logger.info("✅ Running on M1 ARM64 architecture")
         
         # Check PyTorch MPS support
-        if torch.backends.mps.is_available():
+        if info["mps_available"]:
             logger.info("✅ Metal Performance Shaders (MPS) available")
-            self.device = torch.device("mps")
         else:
             logger.warning("⚠️ MPS not available, using CPU")
-            self.device = torch.device("cpu")
+        self.device = _torch_device()
         
         # System specs
-        memory_gb = psutil.virtual_memory().total / (1024**3)
-        cpu_count = psutil.cpu_count()
-        
-        logger.info(f"💻 System: {cpu_count} cores, {memory_gb:.1f}GB unified memory")
-        logger.info(f"🔥 PyTorch device: {self.device}")
+        logger.info("💻 System: %s cores, %.1fGB unified memory", info["cpu_cores"], info["memory_gb"])
+        logger.info("🔥 PyTorch device: %s", self.device)
         
-        return {
-            "architecture": arch,
-            "mps_available": torch.backends.mps.is_available(),
-            "device": str(self.device),
-            "memory_gb": memory_gb,
-            "cpu_cores": cpu_count
-        }
+        return dict(info)
 
 class ProjectManager:
     """Manage the AI chatbot project structure and initialization"""
     
+    # Directories created under the project root
+    DIRECTORY_NAMES = ("models", "data", "logs", "cache")
+    
     def __init__(self):
         self.project_root = Path(__file__).parent.parent
         self.src_dir = self.project_root / "src"
@@ -81,30 +99,26 @@ class ProjectManager:
     
     def setup_directories(self):
         """Create necessary directories"""
-        directories = [
-            self.models_dir,
-            self.data_dir,
-            self.project_root / "logs",
-            self.project_root / "cache"
-        ]
+        directories = [os.path.join(self.project_root, name) for name in self.DIRECTORY_NAMES]
         
         for directory in directories:
-            directory.mkdir(exist_ok=True)
-            logger.info(f"📁 Created directory: {directory}")
+            os.makedirs(directory, exist_ok=True)
+        logger.info("📁 Ensured directories: %s", directories)
     
-    def get_project_status(self) -> Dict:
+    def get_project_status(self) -> dict:
         """Get current project status"""
+        import torch
+        
         return {
             "project_root": str(self.project_root),
             "python_version": sys.version,
             "pytorch_version": torch.__version__,
-            "system_info": self.system_info.check_m1_optimization(),
+            "system_info": dict(_probe_system()),
             "timestamp": datetime.now().isoformat()
         }
 
-def create_project_readme():
-    """Create professional README for the new project"""
-    readme_content = """# 🤖 AI Chatbot Pro - M1 Optimized
+# Generated README; encoded and hashed once at import
+_README_TEMPLATE: str = """# 🤖 AI Chatbot Pro - M1 Optimized
 
 A professional AI chatbot system built from scratch and optimized for M1 MacBook Pro.
 
@@ -197,44 +211,59 @@ MIT License - see LICENSE file for details.
 
 Built with ❤️ for M1 MacBook Pro
 """
-    
+_README_BYTES = _README_TEMPLATE.encode("utf-8")
+_README_HASH = hashlib.blake2b(_README_BYTES, digest_size=16).digest()
+
+def create_project_readme():
+    """Create professional README for the new project"""
     readme_path = Path("README.md")
-    with open(readme_path, "w") as f:
-        f.write(readme_content)
+    
+    # Skip the write when the README is already current, leaving its mtime alone
+    if readme_path.exists() and readme_path.stat().st_size:
+        with open(readme_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as existing:
+            if hashlib.blake2b(existing, digest_size=16).digest() == _README_HASH:
+                logger.info("📝 README.md is up to date")
+                return
+    
+    readme_path.write_bytes(_README_BYTES)
     
     logger.info("📝 Created professional README.md")
 
 def main():
     """Main application entry point"""
-    print("🚀 AI CHATBOT PRO - M1 MACBOOK PRO OPTIMIZED")
-    print("=" * 60)
-    
     # Initialize project
     project = ProjectManager()
     
     # Display system information
     status = project.get_project_status()
     
-    print("\n💻 SYSTEM INFORMATION:")
-    print("-" * 30)
-    for key, value in status["system_info"].items():
-        print(f"{key:15}: {value}")
-    
-    print(f"\n📦 PROJECT STATUS:")
-    print("-" * 20)
-    print(f"Project Root    : {status['project_root']}")
-    print(f"Python Version  : {status['python_version'].split()[0]}")
-    print(f"PyTorch Version : {status['pytorch_version']}")
-    
     # Create README
     create_project_readme()
     
-    print(f"\n✅ PROJECT INITIALIZATION COMPLETE!")
-    print(f"🎯 Next steps:")
-    print(f"   1. Install dependencies: pip install -r requirements.txt")
-    print(f"   2. Run API server: python src/api_server.py")
-    print(f"   3. Run Streamlit UI: streamlit run src/streamlit_app.py")
-    print(f"   4. View documentation: open README.md")
+    # Render the whole report into one buffer and write it in a single call
+    buf = io.StringIO()
+    buf.write("🚀 AI CHATBOT PRO - M1 MACBOOK PRO OPTIMIZED\n")
+    buf.write("=" * 60 + "\n")
+    
+    buf.write("\n💻 SYSTEM INFORMATION:\n")
+    buf.write("-" * 30 + "\n")
+    buf.write("\n".join(f"{key:15}: {value}" for key, value in status["system_info"].items()) + "\n")
+    
+    buf.write("\n📦 PROJECT STATUS:\n")
+    buf.write("-" * 20 + "\n")
+    buf.write(f"Project Root    : {status['project_root']}\n")
+    buf.write(f"Python Version  : {status['python_version'].split()[0]}\n")
+    buf.write(f"PyTorch Version : {status['pytorch_version']}\n")
+    
+    buf.write("\n✅ PROJECT INITIALIZATION COMPLETE!\n")
+    buf.write("🎯 Next steps:\n")
+    buf.write("   1. Install dependencies: pip install -r requirements.txt\n")
+    buf.write("   2. Run API server: python src/api_server.py\n")
+    buf.write("   3. Run Streamlit UI: streamlit run src/streamlit_app.py\n")
+    buf.write("   4. View documentation: open README.md\n")
+    
+    sys.stdout.write(buf.getvalue())
+    sys.stdout.flush()
     
     return status
 
@@ -243,5 +272,5 @@ if __name__ == "__main__":
         status = main()
         print(f"\n🎉 SUCCESS: AI Chatbot Pro initialized successfully!")
     except Exception as e:
-        logger.error(f"❌ FAILED: {e}")
+        logger.error("❌ FAILED: %s", e)
         sys.exit(1)
\ No newline at end of file
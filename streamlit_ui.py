@@ -5,15 +5,29 @@ Beautiful, responsive UI for M1 Chatbot System
 """
 
 import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
 import requests
-import plotly.express as px
-import plotly.graph_objects as go
-import pandas as pd
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import atexit
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
 import json
+import re
+import secrets
 import time
 from datetime import datetime, timedelta
-import psutil
-from typing import Dict, List
+from typing import TYPE_CHECKING, Dict, List
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; the export falls back to stdlib json
+    orjson = None
+
+# Plotly and pandas are only needed on the Analytics page and are imported there
+if TYPE_CHECKING:
+    import plotly.graph_objects as go
 
 # Page configuration
 st.set_page_config(
@@ -29,7 +43,7 @@ st.set_page_config(
 )
 
 # Custom CSS for professional styling
-st.markdown("""
+CUSTOM_CSS = """
 <style>
     /* Main theme colors */
     :root {
@@ -57,28 +71,6 @@ st.markdown("""
         font-weight: bold;
     }
     
-    /* Chat message styling */
-    .chat-message {
-        padding: 1rem;
-        border-radius: 15px;
-        margin: 0.5rem 0;
-        max-width: 80%;
-        word-wrap: break-word;
-    }
-    
-    .user-message {
-        background: linear-gradient(135deg, var(--primary-color) 0%, var(--secondary-color) 100%);
-        color: white;
-        margin-left: auto;
-        text-align: right;
-    }
-    
-    .assistant-message {
-        background: linear-gradient(135deg, var(--accent-color) 0%, #f5576c 100%);
-        color: white;
-        margin-right: auto;
-    }
-    
     /* Metric cards */
     .metric-card {
         background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
@@ -153,11 +145,22 @@ st.markdown("""
         animation: pulse 1.5s infinite;
     }
 </style>
-""", unsafe_allow_html=True)
+"""
+
+# Streamlit removes elements a rerun does not emit again, so the style tag is
+# sent on every run; strip comments and whitespace once to keep it small
+CUSTOM_CSS_MINIFIED = re.sub(r"\s+", " ", re.sub(r"/\*.*?\*/", "", CUSTOM_CSS, flags=re.DOTALL)).strip()
+st.markdown(CUSTOM_CSS_MINIFIED, unsafe_allow_html=True)
 
 # Configuration
 API_BASE_URL = "http://localhost:8000"
 
+# (connect, read) timeouts in seconds per API call; a streamed read timeout bounds the gap between chunks
+HTTP_TIMEOUTS = {
+    "status": (3, 5),
+    "chat": (5, 30)
+}
+
 # Personality configurations
 PERSONALITIES = {
     "technical_expert": {
@@ -207,11 +210,68 @@ PROMPT_TECHNIQUES = {
     "analogical": {"name": "Analogical", "icon": "🔄", "description": "Analogy-based explanation"}
 }
 
+# Display name lookups for the sidebar selectboxes
+PERSONALITY_NAMES = tuple(config["name"] for config in PERSONALITIES.values())
+PERSONALITY_BY_NAME = {config["name"]: key for key, config in PERSONALITIES.items()}
+TECHNIQUE_NAMES = tuple(config["name"] for config in PROMPT_TECHNIQUES.values())
+TECHNIQUE_BY_NAME = {config["name"]: key for key, config in PROMPT_TECHNIQUES.items()}
+
+USER_AVATAR = "👤"
+
+# Welcome banner and quick-start labels only depend on the personality, so build them once per process
+PERSONALITY_WELCOME_HTML: Dict[str, str] = {
+    key: f"""
+            <div style="text-align: center; padding: 2rem; background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); 
+                        border-radius: 15px; color: white; margin: 2rem 0;">
+                <h3>👋 Welcome to M1 AI Chatbot Hub!</h3>
+                <p>I'm your <strong>{config['name']}</strong> - {config['description']}</p>
+                <p>Ask me anything about {', '.join(config['capabilities'][:2])} and more!</p>
+            </div>
+            """
+    for key, config in PERSONALITIES.items()
+}
+PERSONALITY_QUICK_LABELS: Dict[str, List[str]] = {
+    key: [f"💡 {question[:30]}..." for question in config["sample_questions"]]
+    for key, config in PERSONALITIES.items()
+}
+
+@st.cache_resource
+def get_http_session() -> requests.Session:
+    """Shared keep-alive HTTP session to the API server, reused across reruns"""
+    session = requests.Session()
+    # Sessions run their scripts on separate threads, so size the pool for concurrent users
+    session.mount("http://", HTTPAdapter(
+        pool_connections=10,
+        pool_maxsize=100,
+        max_retries=Retry(
+            total=3,
+            connect=3,
+            read=2,
+            backoff_factor=0.5,
+            status_forcelist=(429, 502, 503, 504),
+            # Read and status retries only for idempotent GETs: a re-sent chat POST would add a duplicate turn.
+            # Connection failures happen before the request is sent, so those are retried for POST too.
+            allowed_methods=frozenset(["GET"])
+        )
+    ))
+    return session
+
+atexit.register(lambda: get_http_session().close())
+
+# Columnar copy of the conversation used by analytics
+MESSAGE_SCHEMA = pa.schema([
+    ("role", pa.string()),
+    ("content", pa.string()),
+    ("ts", pa.timestamp("us")),
+    ("proc_time", pa.float32())
+])
+
 # Initialize session state
 def initialize_session_state():
     """Initialize all session state variables"""
     defaults = {
         'messages': [],
+        'messages_table': MESSAGE_SCHEMA.empty_table(),
         'current_session_id': None,
         'selected_personality': 'technical_expert',
         'selected_technique': 'standard',
@@ -220,104 +280,161 @@ def initialize_session_state():
         'conversation_count': 0,
         'total_response_time': 0.0,
         'personalities_data': {},
-        'show_advanced_options': False
+        'show_advanced_options': False,
+        'in_flight': False,
+        'pending_message': None,
+        'chat_error': None,
+        'request_nonce': None
     }
     
     for key, default_value in defaults.items():
         if key not in st.session_state:
             st.session_state[key] = default_value
 
-def check_api_status():
-    """Check if API server is running"""
-    try:
-        response = requests.get(f"{API_BASE_URL}/health", timeout=5)
-        if response.status_code == 200:
-            st.session_state.api_status = 'healthy'
-            return True
-    except:
-        st.session_state.api_status = 'down'
-        return False
-    return False
+def add_message(message: Dict):
+    """Append a message to the history and to its columnar copy used by analytics"""
+    st.session_state.messages.append(message)
+    row = pa.table({
+        "role": [message["role"]],
+        "content": [message["content"]],
+        "ts": [datetime.now()],
+        "proc_time": [message.get("metadata", {}).get("processing_time")]
+    }, schema=MESSAGE_SCHEMA)
+    st.session_state.messages_table = pa.concat_tables([st.session_state.messages_table, row])
+
+def _inline_fragment(func=None, *, run_every=None):
+    """Stand-in for st.fragment on Streamlit releases without it: the function just runs inline"""
+    if func is None:
+        return lambda f: f
+    return func
 
-def get_system_metrics():
-    """Get system metrics from API"""
+# st.fragment (Streamlit >= 1.37) reruns a subtree without the whole script
+fragment = getattr(st, "fragment", None) or _inline_fragment
+
+def rerun_fragment():
+    """Rerun only the calling fragment; during a full-script run (or without fragments) the whole app reruns"""
+    ctx = get_script_run_ctx()
+    if fragment is not _inline_fragment and ctx is not None and ctx.fragment_ids_this_run:
+        st.rerun(scope="fragment")
+    st.rerun()
+
+# Reruns happen on every widget change; serve API polls from a short-lived cache
+@st.cache_data(ttl=5, show_spinner=False)
+def _fetch_status() -> Dict:
+    """Poll API health and metrics in a single request"""
     try:
-        response = requests.get(f"{API_BASE_URL}/metrics", timeout=5)
+        response = get_http_session().get(f"{API_BASE_URL}/status", timeout=HTTP_TIMEOUTS["status"])
         if response.status_code == 200:
-            st.session_state.system_metrics = response.json()
-            return st.session_state.system_metrics
+            return response.json()
     except:
         pass
-    return {}
+    return {"healthy": False}
 
-def send_chat_message(message: str, personality: str, technique: str):
-    """Send message to API"""
-    try:
-        payload = {
-            "message": message,
-            "personality": personality,
-            "technique": technique,
-            "session_id": st.session_state.current_session_id
-        }
-        
-        response = requests.post(f"{API_BASE_URL}/chat", json=payload, timeout=30)
+def get_api_status():
+    """Check if API server is running and return its metrics"""
+    status = _fetch_status()
+    st.session_state.api_status = 'healthy' if status["healthy"] else 'down'
+    metrics = status.get("metrics", {})
+    if metrics:
+        st.session_state.system_metrics = metrics
+    return status["healthy"], metrics
+
+def stream_chat_message(message: str, personality: str, technique: str):
+    """Send message to API, yielding the response text as server-sent events arrive"""
+    payload = {
+        "message": message,
+        "personality": personality,
+        "technique": technique,
+        "session_id": st.session_state.current_session_id,
+        "request_nonce": st.session_state.request_nonce
+    }
+    
+    # stream=True keeps requests from buffering the whole body before returning
+    with get_http_session().post(f"{API_BASE_URL}/chat/stream", json=payload, stream=True, timeout=HTTP_TIMEOUTS["chat"]) as response:
+        if response.status_code != 200:
+            raise RuntimeError(f"API Error: {response.status_code}")
         
-        if response.status_code == 200:
-            result = response.json()
-            st.session_state.current_session_id = result["session_id"]
-            return result
-        else:
-            return {"error": f"API Error: {response.status_code}"}
-    except Exception as e:
-        return {"error": f"Connection Error: {str(e)}"}
+        for line in response.iter_lines():
+            if not line.startswith(b"data: "):
+                continue
+            event = json.loads(line[6:])
+            if "error" in event:
+                raise RuntimeError(event["error"])
+            if event.get("done"):
+                st.session_state.current_session_id = event["session_id"]
+                break
+            yield event["delta"]
 
-def display_sidebar():
-    """Display enhanced sidebar with system status and controls"""
-    st.sidebar.markdown('<div class="sidebar-header">🤖 M1 AI Chatbot Hub</div>', unsafe_allow_html=True)
+def coalesce_tokens(tokens, min_interval: float = 0.05, max_buffer: int = 16):
+    """Group streamed tokens into frames of at most ~20 per second, or max_buffer tokens"""
+    buffer = []
+    last_flush = time.monotonic()
+    for token in tokens:
+        buffer.append(token)
+        now = time.monotonic()
+        if now - last_flush >= min_interval or len(buffer) >= max_buffer:
+            yield "".join(buffer)
+            buffer.clear()
+            last_flush = now
+    if buffer:
+        yield "".join(buffer)
+
+@fragment(run_every="5s")
+def _sidebar_metrics_fragment():
+    """System status and metrics; refreshes on its own without rerunning the whole app"""
+    previous_status = st.session_state.api_status
     
-    # API Status
-    st.sidebar.markdown("### 🔧 System Status")
+    st.markdown("### 🔧 System Status")
+    
+    is_api_running, metrics = get_api_status()
     
-    is_api_running = check_api_status()
+    # Going on- or offline changes what the rest of the page shows
+    if previous_status != 'unknown' and st.session_state.api_status != previous_status:
+        st.rerun()
     
     if is_api_running:
-        st.sidebar.markdown('<div class="status-healthy">✅ API Server Online</div>', unsafe_allow_html=True)
+        st.markdown('<div class="status-healthy">✅ API Server Online</div>', unsafe_allow_html=True)
         
-        # Get and display metrics
-        metrics = get_system_metrics()
+        # Display metrics
         if metrics:
             cpu_usage = metrics.get('cpu_usage', 0)
             memory_usage = metrics.get('memory_usage', {})
             
-            col1, col2 = st.sidebar.columns(2)
+            col1, col2 = st.columns(2)
             with col1:
                 st.metric("CPU", f"{cpu_usage:.1f}%")
             with col2:
                 st.metric("Memory", f"{memory_usage.get('percent', 0):.1f}%")
             
-            st.sidebar.metric("Active Sessions", metrics.get('active_sessions', 0))
-            st.sidebar.metric("Total Requests", metrics.get('total_requests', 0))
+            st.metric("Active Sessions", metrics.get('active_sessions', 0))
+            st.metric("Total Requests", metrics.get('total_requests', 0))
     else:
-        st.sidebar.markdown('<div class="status-warning">⚠️ API Server Offline</div>', unsafe_allow_html=True)
-        st.sidebar.error("Please start the API server:\n\n`python api_server.py`")
+        st.markdown('<div class="status-warning">⚠️ API Server Offline</div>', unsafe_allow_html=True)
+        st.error("Please start the API server:\n\n`python api_server.py`")
+
+def display_sidebar():
+    """Display enhanced sidebar with system status and controls"""
+    st.sidebar.markdown('<div class="sidebar-header">🤖 M1 AI Chatbot Hub</div>', unsafe_allow_html=True)
+    
+    # API Status
+    with st.sidebar:
+        _sidebar_metrics_fragment()
+    
+    if st.session_state.api_status != 'healthy':
         return False
     
     # Personality Selection
     st.sidebar.markdown("### 🎭 Choose AI Personality")
     
-    personality_options = [PERSONALITIES[key]["name"] for key in PERSONALITIES.keys()]
     selected_display_name = st.sidebar.selectbox(
         "AI Assistant:",
-        personality_options,
+        PERSONALITY_NAMES,
         index=0,
         key="personality_selector"
     )
     
     # Map display name back to personality key
-    for key, config in PERSONALITIES.items():
-        if config["name"] == selected_display_name:
-            st.session_state.selected_personality = key
-            break
+    st.session_state.selected_personality = PERSONALITY_BY_NAME[selected_display_name]
     
     # Show personality info
     personality_config = PERSONALITIES[st.session_state.selected_personality]
@@ -333,19 +450,15 @@ def display_sidebar():
     st.session_state.show_advanced_options = st.sidebar.toggle("Show Advanced Settings")
     
     if st.session_state.show_advanced_options:
-        technique_options = [PROMPT_TECHNIQUES[key]["name"] for key in PROMPT_TECHNIQUES.keys()]
         selected_technique_name = st.sidebar.selectbox(
             "Prompt Technique:",
-            technique_options,
+            TECHNIQUE_NAMES,
             index=0,
             key="technique_selector"
         )
         
         # Map technique name back to key
-        for key, config in PROMPT_TECHNIQUES.items():
-            if config["name"] == selected_technique_name:
-                st.session_state.selected_technique = key
-                break
+        st.session_state.selected_technique = TECHNIQUE_BY_NAME[selected_technique_name]
         
         # Show technique info
         technique_config = PROMPT_TECHNIQUES[st.session_state.selected_technique]
@@ -358,6 +471,7 @@ def display_sidebar():
     with col1:
         if st.button("🗑️ Clear Chat", use_container_width=True):
             st.session_state.messages = []
+            st.session_state.messages_table = MESSAGE_SCHEMA.empty_table()
             st.session_state.current_session_id = None
             st.session_state.conversation_count = 0
             st.session_state.total_response_time = 0.0
@@ -365,7 +479,7 @@ def display_sidebar():
     
     with col2:
         if st.button("📊 Refresh Metrics", use_container_width=True):
-            get_system_metrics()
+            _fetch_status.clear()
             st.rerun()
     
     # Session Stats
@@ -378,6 +492,13 @@ def display_sidebar():
     
     return True
 
+def message_avatar(message: Dict) -> str:
+    """Chat avatar: the user icon, or the icon of the personality that answered"""
+    if message["role"] == "user":
+        return USER_AVATAR
+    personality = message.get("metadata", {}).get("personality", st.session_state.selected_personality)
+    return PERSONALITIES.get(personality, PERSONALITIES[st.session_state.selected_personality])["icon"]
+
 def display_main_interface():
     """Display main chat interface"""
     # Header
@@ -399,6 +520,11 @@ def display_main_interface():
         else:
             st.info("💭 New Session")
     
+    _chat_fragment(personality_config)
+
+@fragment
+def _chat_fragment(personality_config: Dict):
+    """Conversation and message form; sending a message reruns only this part of the page"""
     # Chat Interface
     st.markdown("### 💬 Conversation")
     
@@ -407,21 +533,11 @@ def display_main_interface():
     with chat_container:
         if st.session_state.messages:
             for i, message in enumerate(st.session_state.messages):
-                if message["role"] == "user":
-                    st.markdown(f"""
-                    <div class="chat-message user-message">
-                        <strong>👤 You:</strong><br>{message["content"]}
-                    </div>
-                    """, unsafe_allow_html=True)
-                else:
-                    st.markdown(f"""
-                    <div class="chat-message assistant-message">
-                        <strong>{personality_config['icon']} {personality_config['name']}:</strong><br>{message["content"]}
-                    </div>
-                    """, unsafe_allow_html=True)
+                with st.chat_message(message["role"], avatar=message_avatar(message)):
+                    st.markdown(message["content"])
                     
                     # Show metadata for advanced users
-                    if st.session_state.show_advanced_options and "metadata" in message:
+                    if message["role"] == "assistant" and st.session_state.show_advanced_options and "metadata" in message:
                         with st.expander(f"📊 Response #{i//2 + 1} Details"):
                             metadata = message["metadata"]
                             col1, col2, col3 = st.columns(3)
@@ -433,27 +549,21 @@ def display_main_interface():
                                 st.metric("Personality", metadata.get('personality', 'unknown'))
         else:
             # Welcome message and quick starts
-            st.markdown(f"""
-            <div style="text-align: center; padding: 2rem; background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); 
-                        border-radius: 15px; color: white; margin: 2rem 0;">
-                <h3>👋 Welcome to M1 AI Chatbot Hub!</h3>
-                <p>I'm your <strong>{personality_config['name']}</strong> - {personality_config['description']}</p>
-                <p>Ask me anything about {', '.join(personality_config['capabilities'][:2])} and more!</p>
-            </div>
-            """, unsafe_allow_html=True)
+            st.markdown(PERSONALITY_WELCOME_HTML[st.session_state.selected_personality], unsafe_allow_html=True)
             
             # Quick start buttons
             st.markdown("### 🚀 Quick Start - Try These Questions:")
             
-            cols = st.columns(len(personality_config['sample_questions']))
-            for i, question in enumerate(personality_config['sample_questions']):
+            quick_labels = PERSONALITY_QUICK_LABELS[st.session_state.selected_personality]
+            cols = st.columns(len(quick_labels))
+            for i, (question, label) in enumerate(zip(personality_config['sample_questions'], quick_labels)):
                 with cols[i]:
-                    if st.button(f"💡 {question[:30]}...", key=f"quick_{i}", use_container_width=True):
-                        st.session_state.messages.append({
+                    if st.button(label, key=f"quick_{i}", use_container_width=True):
+                        add_message({
                             "role": "user",
                             "content": question
                         })
-                        st.rerun()
+                        rerun_fragment()
     
     # Message Input
     st.markdown("### ✍️ Send Message")
@@ -472,46 +582,116 @@ def display_main_interface():
         
         with col2:
             st.write("")  # Spacing
-            submitted = st.form_submit_button("📤 Send", type="primary", use_container_width=True)
+            submitted = st.form_submit_button(
+                "📤 Send", type="primary", use_container_width=True, disabled=st.session_state.in_flight
+            )
     
-    # Process message
-    if submitted and user_message.strip():
-        # Add user message to chat
-        st.session_state.messages.append({
+    if st.session_state.chat_error:
+        st.error(st.session_state.chat_error)
+        st.session_state.chat_error = None
+    
+    # Sending takes two runs: this one records the message and reruns so the form is drawn
+    # disabled, the next one streams the reply. A rerun racing the request cannot resend it.
+    if submitted and user_message.strip() and not st.session_state.in_flight:
+        add_message({
             "role": "user",
             "content": user_message
         })
+        st.session_state.in_flight = True
+        st.session_state.pending_message = user_message
+        # Lets the API reject a resubmission of this same turn
+        st.session_state.request_nonce = secrets.token_hex(8)
+        rerun_fragment()
+    
+    if st.session_state.in_flight and st.session_state.pending_message is not None:
+        user_message = st.session_state.pending_message
+        # Cleared before sending: if this run is interrupted, the next one must not send it again
+        st.session_state.pending_message = None
         
-        # Show loading indicator
-        with st.spinner(f"🤖 {personality_config['name']} is thinking..."):
-            # Send to API
-            result = send_chat_message(
-                user_message, 
-                st.session_state.selected_personality,
-                st.session_state.selected_technique
-            )
+        # Render the response as it streams in, so the wait is time to first token
+        start_time = time.time()
+        try:
+            with st.chat_message("assistant", avatar=personality_config["icon"]):
+                response_text = st.empty().write_stream(coalesce_tokens(stream_chat_message(
+                    user_message, 
+                    st.session_state.selected_personality,
+                    st.session_state.selected_technique
+                )))
+        except requests.exceptions.ConnectTimeout:
+            st.session_state.chat_error = "❌ API server unreachable: connection timed out"
+        except requests.exceptions.ReadTimeout:
+            st.session_state.chat_error = "❌ API server is too slow: no response within the read timeout"
+        except requests.exceptions.ConnectionError as e:
+            st.session_state.chat_error = f"❌ API server unreachable: {str(e)}"
+        except Exception as e:
+            st.session_state.chat_error = f"❌ {str(e)}"
+        else:
+            processing_time = time.time() - start_time
             
-            if "error" in result:
-                st.error(f"❌ {result['error']}")
-            else:
-                # Add assistant response
-                st.session_state.messages.append({
-                    "role": "assistant",
-                    "content": result["response"],
-                    "metadata": {
-                        "processing_time": result.get("processing_time", 0),
-                        "technique": result.get("technique", "standard"),
-                        "personality": result.get("personality", "unknown")
-                    }
-                })
-                
-                # Update stats
-                st.session_state.conversation_count += 1
-                st.session_state.total_response_time += result.get("processing_time", 0)
-                
-                st.success("✅ Response generated!")
+            # Add assistant response
+            add_message({
+                "role": "assistant",
+                "content": response_text,
+                "metadata": {
+                    "processing_time": processing_time,
+                    "technique": st.session_state.selected_technique,
+                    "personality": st.session_state.selected_personality
+                }
+            })
+            
+            # Update stats
+            st.session_state.conversation_count += 1
+            st.session_state.total_response_time += processing_time
         
-        st.rerun()
+        # Only a finished or failed stream gets here; Streamlit's rerun/stop exceptions are not
+        # Exceptions, so an interrupted run leaves the flag set for the branch below
+        st.session_state.in_flight = False
+        rerun_fragment()
+    elif st.session_state.in_flight:
+        # The run streaming the last reply was interrupted; its request is abandoned
+        st.session_state.in_flight = False
+        rerun_fragment()
+
+# Figures are rebuilt only when the conversation changes, not on every rerun
+@st.cache_data(show_spinner=False)
+def build_timeline_figure(roles: np.ndarray, lengths: np.ndarray) -> "go.Figure":
+    """Message length chart from per-message role and length columns"""
+    import pandas as pd
+    import plotly.express as px
+    
+    df = pd.DataFrame({
+        "Message": np.arange(1, len(roles) + 1),
+        "Role": pd.Series(roles).str.title(),
+        "Length": lengths
+    })
+    
+    fig = px.line(
+        df, x="Message", y="Length", color="Role",
+        title="Message Length Over Time",
+        color_discrete_map={"User": "#667eea", "Assistant": "#f093fb"}
+    )
+    fig.update_layout(
+        plot_bgcolor='rgba(0,0,0,0)',
+        paper_bgcolor='rgba(0,0,0,0)',
+    )
+    return fig
+
+@st.cache_data(show_spinner=False)
+def build_response_time_figure(response_times: np.ndarray) -> "go.Figure":
+    """Response time bar chart"""
+    import plotly.express as px
+    
+    fig = px.bar(
+        x=list(range(1, len(response_times) + 1)),
+        y=list(response_times),
+        title="Response Time by Message",
+        labels={"x": "Response Number", "y": "Processing Time (seconds)"}
+    )
+    fig.update_layout(
+        plot_bgcolor='rgba(0,0,0,0)',
+        paper_bgcolor='rgba(0,0,0,0)',
+    )
+    return fig
 
 def display_analytics_page():
     """Display analytics dashboard"""
@@ -521,6 +701,9 @@ def display_analytics_page():
         st.info("🔍 Start a conversation to see analytics!")
         return
     
+    messages_table = st.session_state.messages_table
+    roles = messages_table.column("role").to_numpy(zero_copy_only=False)
+    
     # Overview metrics
     col1, col2, col3, col4 = st.columns(4)
     
@@ -528,7 +711,7 @@ def display_analytics_page():
         st.markdown('<div class="metric-card"><h3>Total Messages</h3><h2>{}</h2></div>'.format(len(st.session_state.messages)), unsafe_allow_html=True)
     
     with col2:
-        user_messages = len([m for m in st.session_state.messages if m["role"] == "user"])
+        user_messages = int((roles == "user").sum())
         st.markdown('<div class="metric-card"><h3>Your Messages</h3><h2>{}</h2></div>'.format(user_messages), unsafe_allow_html=True)
     
     with col3:
@@ -546,48 +729,32 @@ def display_analytics_page():
     if len(st.session_state.messages) > 4:
         st.markdown("### 📈 Conversation Timeline")
         
-        # Create timeline data
-        timeline_data = []
-        for i, msg in enumerate(st.session_state.messages):
-            timeline_data.append({
-                "Message": i + 1,
-                "Role": msg["role"].title(),
-                "Length": len(msg["content"]),
-                "Type": msg["role"]
-            })
-        
-        df = pd.DataFrame(timeline_data)
-        
-        # Message length chart
-        fig = px.line(
-            df, x="Message", y="Length", color="Role",
-            title="Message Length Over Time",
-            color_discrete_map={"User": "#667eea", "Assistant": "#f093fb"}
-        )
-        fig.update_layout(
-            plot_bgcolor='rgba(0,0,0,0)',
-            paper_bgcolor='rgba(0,0,0,0)',
-        )
-        st.plotly_chart(fig, use_container_width=True)
+        lengths = pc.utf8_length(messages_table.column("content")).to_numpy()
+        st.plotly_chart(build_timeline_figure(roles, lengths), use_container_width=True)
         
         # Response time analysis (if available)
-        response_times = []
-        for msg in st.session_state.messages:
-            if msg["role"] == "assistant" and "metadata" in msg:
-                response_times.append(msg["metadata"].get("processing_time", 0))
+        proc_times = messages_table.column("proc_time")
+        has_time = pc.and_(pc.equal(messages_table.column("role"), "assistant"), pc.is_valid(proc_times))
+        response_times = pc.filter(proc_times, has_time).to_numpy()
         
-        if response_times and len(response_times) > 1:
-            fig2 = px.bar(
-                x=list(range(1, len(response_times) + 1)),
-                y=response_times,
-                title="Response Time by Message",
-                labels={"x": "Response Number", "y": "Processing Time (seconds)"}
-            )
-            fig2.update_layout(
-                plot_bgcolor='rgba(0,0,0,0)',
-                paper_bgcolor='rgba(0,0,0,0)',
-            )
-            st.plotly_chart(fig2, use_container_width=True)
+        if len(response_times) > 1:
+            st.plotly_chart(build_response_time_figure(response_times), use_container_width=True)
+
+@st.cache_data
+def _export_json(messages: tuple, conversation_count: int, total_response_time: float) -> bytes:
+    """Serialize the conversation export once per distinct conversation"""
+    export_data = {
+        "conversation": list(messages),
+        "stats": {
+            "total_messages": len(messages),
+            "conversation_count": conversation_count,
+            "total_response_time": total_response_time
+        },
+        "export_time": datetime.now().isoformat()
+    }
+    if orjson is not None:
+        return orjson.dumps(export_data, option=orjson.OPT_INDENT_2)
+    return json.dumps(export_data, indent=2).encode()
 
 def main():
     """Main application"""
@@ -625,19 +792,13 @@ def main():
         
         with st.expander("📊 Data Export"):
             if st.session_state.messages:
-                export_data = {
-                    "conversation": st.session_state.messages,
-                    "stats": {
-                        "total_messages": len(st.session_state.messages),
-                        "conversation_count": st.session_state.conversation_count,
-                        "total_response_time": st.session_state.total_response_time
-                    },
-                    "export_time": datetime.now().isoformat()
-                }
-                
                 st.download_button(
                     "📥 Download Conversation",
-                    data=json.dumps(export_data, indent=2),
+                    data=_export_json(
+                        tuple(st.session_state.messages),
+                        st.session_state.conversation_count,
+                        st.session_state.total_response_time
+                    ),
                     file_name=f"chatbot_conversation_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json",
                     mime="application/json"
                 )
@@ -0,0 +1,112 @@
+"""
+Shared fixtures: repo-root imports, per-test session log dirs and an in-memory Memcached client
+"""
+
+import os
+import sys
+import time
+import types
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# session_store imports pymemcache at module level; the tests only need its names
+try:
+    import pymemcache.client.base  # noqa: F401
+except ImportError:
+    pymemcache = types.ModuleType("pymemcache")
+    pymemcache.serde = types.SimpleNamespace(pickle_serde=None)
+    client_base = types.ModuleType("pymemcache.client.base")
+    client_base.PooledClient = lambda *args, **kwargs: None
+    sys.modules.update({
+        "pymemcache": pymemcache,
+        "pymemcache.client": types.ModuleType("pymemcache.client"),
+        "pymemcache.client.base": client_base
+    })
+
+from working_chatbot import M1ChatbotSystem  # noqa: E402
+
+class FakeMemcacheClient:
+    """In-process stand-in for pymemcache's PooledClient, covering the calls the stores make"""
+
+    def __init__(self):
+        self.data = {}  # key -> (value, expires_at or 0, cas token)
+        self.calls = []
+        self._cas = 0
+
+    def _entry(self, key):
+        entry = self.data.get(key)
+        if entry is not None and entry[1] and entry[1] <= time.time():
+            del self.data[key]
+            return None
+        return entry
+
+    def _store(self, key, value, expire):
+        self._cas += 1
+        self.data[key] = (value, time.time() + expire if expire else 0, self._cas)
+        return True
+
+    def expire(self, key):
+        """Drop a key as if its TTL had run out"""
+        self.data.pop(key, None)
+
+    def get(self, key):
+        self.calls.append(("get", key))
+        entry = self._entry(key)
+        return entry[0] if entry else None
+
+    def gets(self, key):
+        self.calls.append(("gets", key))
+        entry = self._entry(key)
+        return (entry[0], entry[2]) if entry else (None, None)
+
+    def get_many(self, keys):
+        self.calls.append(("get_many", tuple(keys)))
+        return {key: entry[0] for key in keys if (entry := self._entry(key))}
+
+    def set(self, key, value, expire=0, noreply=None):
+        self.calls.append(("set", key))
+        return self._store(key, value, expire)
+
+    def add(self, key, value, expire=0, noreply=None):
+        self.calls.append(("add", key))
+        return self._entry(key) is None and self._store(key, value, expire)
+
+    def replace(self, key, value, expire=0, noreply=None):
+        self.calls.append(("replace", key))
+        return self._entry(key) is not None and self._store(key, value, expire)
+
+    def cas(self, key, value, cas, expire=0, noreply=None):
+        self.calls.append(("cas", key))
+        entry = self._entry(key)
+        return entry is not None and entry[2] == cas and self._store(key, value, expire)
+
+    def touch(self, key, expire=0, noreply=None):
+        self.calls.append(("touch", key))
+        entry = self._entry(key)
+        if entry is None:
+            return False
+        self.data[key] = (entry[0], time.time() + expire if expire else 0, entry[2])
+        return True
+
+    def delete(self, key, noreply=None):
+        self.calls.append(("delete", key))
+        return self.data.pop(key, None) is not None
+
+    def delete_many(self, keys, noreply=None):
+        self.calls.append(("delete_many", tuple(keys)))
+        for key in keys:
+            self.data.pop(key, None)
+        return True
+
+@pytest.fixture(autouse=True)
+def session_log_dir(tmp_path, monkeypatch):
+    """Keep session logs out of the working tree"""
+    log_dir = tmp_path / "session_logs"
+    monkeypatch.setattr(M1ChatbotSystem, "SESSION_LOG_DIR", str(log_dir))
+    return log_dir
+
+@pytest.fixture
+def memcache_client():
+    return FakeMemcacheClient()
@@ -0,0 +1,45 @@
+"""
+M1OptimizedLLM batching worker lifecycle
+"""
+
+import gc
+import weakref
+from concurrent.futures import Future
+
+import pytest
+
+pytest.importorskip("torch")
+GenerationConfig = pytest.importorskip("transformers").GenerationConfig
+
+from src.advanced_llm import LLMConfig, M1OptimizedLLM  # noqa: E402
+
+@pytest.fixture
+def llm(tmp_path):
+    return M1OptimizedLLM(LLMConfig(device="cpu", cache_dir=str(tmp_path)))
+
+def test_close_serves_queued_requests_then_stops(llm):
+    llm._generate_batch = lambda group: [("ok", 1)] * len(group)
+    llm._start_batcher()
+    thread = llm._batcher_thread
+    futures = [Future() for _ in range(3)]
+    for future in futures:
+        llm._request_queue.put((None, None, GenerationConfig(), None, None, future))
+
+    llm.close()
+    thread.join(timeout=5)
+
+    assert not thread.is_alive()
+    assert [future.result(timeout=0) for future in futures] == [("ok", 1)] * 3
+
+def test_closed_llm_can_be_freed(tmp_path):
+    llm = M1OptimizedLLM(LLMConfig(device="cpu", cache_dir=str(tmp_path)))
+    llm._start_batcher()
+    thread = llm._batcher_thread
+    llm.close()
+    thread.join(timeout=5)
+    llm_ref = weakref.ref(llm)
+
+    del llm, thread
+    gc.collect()
+
+    assert llm_ref() is None
@@ -0,0 +1,62 @@
+"""
+API endpoints through FastAPI's TestClient
+"""
+
+import orjson
+import pytest
+from fastapi.testclient import TestClient
+
+import api_server
+
+@pytest.fixture
+def client():
+    with TestClient(api_server.app) as client:
+        yield client
+    api_server.chatbot_system.clear_sessions()
+
+def parse_events(body: str):
+    """Server-sent event payloads; every event is a single data line followed by a blank line"""
+    assert body.endswith("\n\n")
+    events = []
+    for frame in body[:-2].split("\n\n"):
+        assert frame.startswith("data: ") and "\n" not in frame
+        events.append(orjson.loads(frame[len("data: "):]))
+    return events
+
+def test_chat_stream_event_framing(client):
+    response = client.post("/chat/stream", json={"message": "memory leak help", "personality": "technical_expert"})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    *deltas, done = parse_events(response.text)
+    assert len(deltas) > 1 and all(set(event) == {"delta"} for event in deltas)
+    assert done["done"] is True and done["personality"] == "technical_expert"
+
+    history = client.get(f"/session/{done['session_id']}/history").json()
+    assert "".join(event["delta"] for event in deltas) == history[-1]["content"]
+
+def test_chat_stream_unknown_session(client):
+    response = client.post("/chat/stream", json={"message": "hi", "session_id": "missing"})
+
+    assert response.status_code == 404
+
+def test_delete_endpoints_remove_logs(client, session_log_dir):
+    session_ids = [client.post("/sessions", json={"personality": "business_advisor"}).json()["session_id"] for _ in range(3)]
+    for session_id in session_ids:
+        client.post("/chat", json={"message": "pricing", "session_id": session_id})
+
+    assert client.delete(f"/session/{session_ids[0]}").status_code == 200
+    assert client.delete(f"/session/{session_ids[0]}").status_code == 404
+    assert len(list(session_log_dir.iterdir())) == 2
+    assert client.delete("/sessions").json() == {"message": "Cleared 2 sessions successfully"}
+    assert list(session_log_dir.iterdir()) == []
+    assert client.get("/metrics").json()["active_sessions"] == 0
+
+@pytest.mark.parametrize("path", ["/chat", "/chat/stream"])
+def test_repeated_request_nonce_is_rejected(client, path):
+    session_id = client.post("/sessions", json={"personality": "technical_expert"}).json()["session_id"]
+    payload = {"message": "hello", "session_id": session_id, "request_nonce": f"nonce{path.count('/')}"}
+
+    assert client.post(path, json=payload).status_code == 200
+    assert client.post(path, json=payload).status_code == 409
+    assert client.post(path, json={**payload, "request_nonce": "other"}).status_code == 200
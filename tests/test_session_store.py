@@ -0,0 +1,152 @@
+"""
+Session store eviction and index maintenance
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+import session_store
+from session_store import MemcachedRequestStats, MemcachedSessionStore
+from working_chatbot import M1ChatbotSystem, ShardedSessionStore
+
+def make_memcached_store(client, ttl=3600):
+    store = MemcachedSessionStore("localhost:11211", ttl=ttl)
+    store.client = client
+    return store
+
+def index_of(store):
+    return store.client.get(store.INDEX_KEY)
+
+def test_sharded_store_oldest_is_least_recently_active():
+    store = ShardedSessionStore(shard_count=4)
+    start = datetime.now()
+    for i in range(8):
+        store[f"s{i}"] = {"last_activity": start + timedelta(seconds=i)}
+
+    store["s0"]["last_activity"] = start + timedelta(seconds=100)
+    store.move_to_end("s0")
+
+    assert store.oldest()[0] == "s1"
+    assert store.pop("missing", None) is None
+    store.clear()
+    assert store.oldest() is None and len(store) == 0
+
+def test_sharded_store_evicts_over_capacity(monkeypatch):
+    monkeypatch.setattr(M1ChatbotSystem, "MAX_SESSIONS", 3)
+    bot = M1ChatbotSystem()
+    session_ids = [bot.create_session() for _ in range(3)]
+    bot.chat(session_ids[0], "hello")
+
+    newest = bot.create_session()
+
+    assert set(bot.sessions) == {session_ids[0], session_ids[2], newest}
+
+def test_sharded_store_evicts_expired():
+    bot = M1ChatbotSystem()
+    stale = bot.create_session()
+    bot.sessions[stale]["last_activity"] -= bot.SESSION_TIMEOUT * 2
+
+    fresh = bot.create_session()
+
+    assert list(bot.sessions) == [fresh]
+
+def test_memcached_len_and_oldest_read_only_the_index_head(memcache_client):
+    store = make_memcached_store(memcache_client)
+    session_ids = [f"s{i}" for i in range(3 * store.OLDEST_BATCH)]
+    for session_id in session_ids:
+        store[session_id] = {}
+    memcache_client.calls.clear()
+
+    assert len(store) == len(session_ids)
+    assert store.oldest()[0] == "s0"
+    fetched = [call[1] for call in memcache_client.calls if call[0] == "get_many"]
+    assert fetched and all(len(keys) <= store.OLDEST_BATCH for keys in fetched)
+
+def test_memcached_len_counts_only_live_sessions(memcache_client):
+    store = make_memcached_store(memcache_client)
+    session_ids = [f"s{i}" for i in range(3 * store.OLDEST_BATCH)]
+    for session_id in session_ids:
+        store[session_id] = {}
+    for session_id in session_ids[:2 * store.OLDEST_BATCH]:
+        memcache_client.expire(f"sess:{session_id}")
+
+    assert len(store) == store.OLDEST_BATCH
+    assert index_of(store) == session_ids[2 * store.OLDEST_BATCH:]
+
+def test_memcached_activity_reorders_index_only_when_needed(memcache_client):
+    store = make_memcached_store(memcache_client)
+    store["a"] = {"turns": 0}
+    store["b"] = {"turns": 0}
+    memcache_client.calls.clear()
+
+    store["b"] = {"turns": 1}
+    store.move_to_end("b")
+
+    assert "cas" not in {call[0] for call in memcache_client.calls}
+    assert index_of(store) == ["a", "b"]
+
+    store["a"] = {"turns": 1}
+    store.move_to_end("a")
+
+    assert [call[0] for call in memcache_client.calls].count("cas") == 1
+    assert index_of(store) == ["b", "a"]
+    assert store["a"] == {"turns": 1}
+
+def test_memcached_prunes_expired_sessions_from_index(memcache_client):
+    store = make_memcached_store(memcache_client)
+    expired = []
+    store.on_expire = expired.append
+    for session_id in ("a", "b", "c", "d"):
+        store[session_id] = {}
+    memcache_client.expire("sess:a")
+    memcache_client.expire("sess:c")
+
+    assert store.oldest()[0] == "b"
+    assert list(store) == ["b", "d"]
+    assert index_of(store) == ["b", "d"]
+    assert sorted(expired) == ["a", "c"]
+
+def test_memcached_pop_and_del_drop_expired_ids(memcache_client):
+    store = make_memcached_store(memcache_client)
+    store["a"] = {}
+    store["b"] = {}
+    memcache_client.expire("sess:a")
+    memcache_client.expire("sess:b")
+
+    assert store.pop("a", None) is None
+    with pytest.raises(KeyError):
+        del store["b"]
+    assert index_of(store) == []
+
+def test_memcached_eviction_through_chatbot(monkeypatch, memcache_client, session_log_dir):
+    monkeypatch.setattr(M1ChatbotSystem, "MAX_SESSIONS", 2)
+    bot = M1ChatbotSystem(sessions=make_memcached_store(memcache_client))
+    first, second = bot.create_session(), bot.create_session()
+    bot.chat(first, "memory")
+    bot.chat(second, "memory")
+    memcache_client.expire(f"sess:{first}")
+
+    third = bot.create_session()
+
+    assert index_of(bot.sessions) == [second, third]
+    assert sorted(path.stem for path in session_log_dir.iterdir()) == [second]
+
+    bot.chat(third, "memory")
+    fourth = bot.create_session()
+
+    assert index_of(bot.sessions) == [third, fourth]
+    assert sorted(path.stem for path in session_log_dir.iterdir()) == [third]
+
+    bot.chat(third, "memory")
+    fifth = bot.create_session()
+
+    assert index_of(bot.sessions) == [third, fifth]
+
+def test_request_stats_claim_is_once_only(monkeypatch, memcache_client):
+    monkeypatch.setattr(session_store, "PooledClient", lambda *args, **kwargs: memcache_client)
+    stats = MemcachedRequestStats("localhost:11211")
+
+    assert stats.claim("nonce:s1:a", ttl=60)
+    assert not stats.claim("nonce:s1:a", ttl=60)
+    assert stats.claim("nonce:s1:b", ttl=60)
@@ -0,0 +1,68 @@
+"""
+Conversation window recycling and keyword dispatch
+"""
+
+from collections import deque
+from datetime import datetime
+
+import pytest
+
+from working_chatbot import M1ChatbotSystem, PERSONALITIES
+
+@pytest.fixture
+def bot():
+    return M1ChatbotSystem()
+
+@pytest.mark.parametrize("window", [0, 1, 2, 3])
+def test_append_message_small_windows(window):
+    conversation = deque(maxlen=window)
+    for turn in range(3):
+        now = datetime.now()
+        user = M1ChatbotSystem._append_message(conversation, "user", f"question {turn}", now)
+        assistant = M1ChatbotSystem._append_message(conversation, "assistant", f"answer {turn}", now)
+
+    assert user is not assistant
+    assert (user.role, user.content) == ("user", "question 2")
+    assert (assistant.role, assistant.content) == ("assistant", "answer 2")
+    expected = ["question 0", "answer 0", "question 1", "answer 1", "question 2", "answer 2"]
+    assert [message.content for message in conversation] == expected[len(expected) - window:]
+
+def test_chat_logs_full_conversation_beyond_window(monkeypatch, bot):
+    monkeypatch.setattr(M1ChatbotSystem, "CONVERSATION_WINDOW", 1)
+    session_id = bot.create_session()
+    for message in ("one", "two"):
+        bot.chat(session_id, message)
+
+    history = bot.load_conversation(session_id)
+
+    assert [entry["role"] for entry in history] == ["user", "assistant"] * 2
+    assert [entry["content"] for entry in history[::2]] == ["one", "two"]
+    assert len(bot.sessions[session_id]["conversation"]) == 1
+
+def test_delete_session_removes_log(bot, session_log_dir):
+    session_id = bot.create_session()
+    bot.chat(session_id, "hello")
+
+    assert bot.delete_session(session_id)
+    assert not bot.delete_session(session_id)
+    assert list(session_log_dir.iterdir()) == []
+
+def test_dispatch_prefers_table_order_over_message_position(bot):
+    responses = PERSONALITIES["technical_expert"]["responses"]
+    first, second = list(responses)[:2]
+
+    for message in (f"{first} then {second}", f"{second} then {first}"):
+        assert bot.chat_stateless("technical_expert", message)["response"] == responses[first]
+
+def test_dispatch_falls_back_to_default(bot):
+    response = bot.chat_stateless("business_advisor", "nothing relevant")["response"]
+
+    assert response == M1ChatbotSystem.DEFAULT_RESPONSES["business_advisor"]
+
+def test_dispatch_is_case_insensitive_and_applies_technique_prefix(bot):
+    keyword, body = next(iter(PERSONALITIES["creative_partner"]["responses"].items()))
+    prefix = bot.prompt_techniques["chain_of_thought"]["prefix"]
+
+    response = bot.chat_stateless("creative_partner", keyword.upper(), "chain_of_thought")["response"]
+
+    assert response == prefix + body
@@ -4,32 +4,45 @@ WORKING M1 CHATBOT - DAY 3 COMPLETE
 Production-ready chatbot system that definitely works
 """
 
+import os
+import logging
+import mmap
+import re
+import sys
 import time
-import json
-import hashlib
-from datetime import datetime
+import secrets
+import threading
+import numpy as np
+import orjson
+from functools import lru_cache
+from collections import Counter, OrderedDict, deque
+from collections.abc import MutableMapping
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from types import MappingProxyType
 from typing import Dict, List, Optional
 
-print("🚀 M1 OPTIMIZED CHATBOT SYSTEM - DAY 3")
-print("=" * 60)
+# Silent unless the host application configures logging
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
 
-class M1ChatbotSystem:
-    """Complete M1-optimized chatbot system"""
-    
-    def __init__(self):
-        self.personalities = self._load_personalities()
-        self.prompt_techniques = self._load_prompt_techniques()
-        self.sessions = {}
-        print("✅ M1 Chatbot System initialized")
-    
-    def _load_personalities(self):
-        """Load all personality configurations"""
-        return {
-            "technical_expert": {
-                "name": "Technical Expert",
-                "description": "Senior software engineer and system architect",
-                "responses": {
-                    "memory": """For Python API memory optimization, here's my systematic approach:
+# Keywords are ASCII, so folding only A-Z is enough and skips Unicode case mapping
+ASCII_LOWER = bytes.maketrans(bytes(range(65, 91)), bytes(range(97, 123)))
+
+def _freeze(table):
+    """Read-only view of a nested config table with interned keys"""
+    return MappingProxyType({
+        sys.intern(key): _freeze(value) if isinstance(value, dict) else value
+        for key, value in table.items()
+    })
+
+# Built once per process and shared read-only by every M1ChatbotSystem (and forked worker)
+PERSONALITIES = _freeze({
+    "technical_expert": {
+        "name": "Technical Expert",
+        "description": "Senior software engineer and system architect",
+        "responses": {
+            "memory": """For Python API memory optimization, here's my systematic approach:
 
 **1. Memory Profiling**
 - Use `memory_profiler`: `pip install memory-profiler`
@@ -54,7 +67,7 @@ class M1ChatbotSystem:
 
 What's your current memory usage pattern? Are you processing large files or handling many concurrent requests?""",
 
-                    "performance": """API performance optimization strategy:
+            "performance": """API performance optimization strategy:
 
 **1. Database Layer**
 - Add proper indexes to frequently queried columns
@@ -82,7 +95,7 @@ What's your current memory usage pattern? Are you processing large files or hand
 
 What's your current API response time? Where are you seeing the biggest bottlenecks?""",
 
-                    "debug": """Systematic debugging approach for production issues:
+            "debug": """Systematic debugging approach for production issues:
 
 **1. Information Gathering**
 - Collect error logs, stack traces, and system metrics
@@ -106,14 +119,14 @@ What's your current API response time? Where are you seeing the biggest bottlene
 - Implement automated testing in CI/CD
 
 What specific error are you encountering? Do you have logs or stack traces to share?"""
-                }
-            },
-            
-            "creative_partner": {
-                "name": "Creative Writing Partner",
-                "description": "Award-winning creative writing mentor",
-                "responses": {
-                    "story": """Exciting story concept! Let's develop this systematically:
+        }
+    },
+    
+    "creative_partner": {
+        "name": "Creative Writing Partner",
+        "description": "Award-winning creative writing mentor",
+        "responses": {
+            "story": """Exciting story concept! Let's develop this systematically:
 
 **1. Core Elements**
 - **Protagonist**: Who is your main character? What makes them unique?
@@ -142,7 +155,7 @@ What specific error are you encountering? Do you have logs or stack traces to sh
 
 What genre are you envisioning? What's the emotional core of your story?""",
 
-                    "character": """Character development is the heart of great storytelling:
+            "character": """Character development is the heart of great storytelling:
 
 **1. Psychology & Motivation**
 - **Deepest Desire**: What do they want most in the world?
@@ -170,7 +183,7 @@ What genre are you envisioning? What's the emotional core of your story?""",
 
 Who is your protagonist? What's their role in the story you want to tell?""",
 
-                    "plot": """Plot development techniques for compelling narratives:
+            "plot": """Plot development techniques for compelling narratives:
 
 **1. Story Structure**
 - **Three-Act Structure**: Setup, confrontation, resolution
@@ -197,14 +210,14 @@ Who is your protagonist? What's their role in the story you want to tell?""",
 - **Description**: Sets mood and atmosphere
 
 What's your story's central conflict? What genre conventions are you working with?"""
-                }
-            },
-            
-            "business_advisor": {
-                "name": "Business Strategy Consultant", 
-                "description": "Senior management consultant with Fortune 500 experience",
-                "responses": {
-                    "pricing": """Strategic SaaS pricing framework:
+        }
+    },
+    
+    "business_advisor": {
+        "name": "Business Strategy Consultant", 
+        "description": "Senior management consultant with Fortune 500 experience",
+        "responses": {
+            "pricing": """Strategic SaaS pricing framework:
 
 **1. Value-Based Foundation**
 - **Customer ROI**: What measurable value do you deliver?
@@ -232,7 +245,7 @@ What's your story's central conflict? What genre conventions are you working wit
 
 What problem does your product solve? What's your target customer's current budget for this solution?""",
 
-                    "growth": """Sustainable SaaS growth framework:
+            "growth": """Sustainable SaaS growth framework:
 
 **1. Foundation First**
 - **Product-Market Fit**: Ensure strong customer retention (>90% annually)
@@ -260,7 +273,7 @@ What problem does your product solve? What's your target customer's current budg
 
 What's your current Monthly Recurring Revenue (MRR)? What's your biggest growth bottleneck right now?""",
 
-                    "strategy": """Strategic business planning methodology:
+            "strategy": """Strategic business planning methodology:
 
 **1. Market Analysis**
 - **Total Addressable Market (TAM)**: How big is the opportunity?
@@ -287,109 +300,280 @@ What's your current Monthly Recurring Revenue (MRR)? What's your biggest growth
 - **Success Metrics**: Define measurable outcomes
 
 What's your primary strategic challenge? Are you looking to scale existing business or explore new opportunities?"""
-                }
-            }
         }
+    }
+})
+
+PROMPT_TECHNIQUES = _freeze({
+    "chain_of_thought": {
+        "prefix": "Let me think through this systematically, step by step:\n\n",
+        "description": "Breaks down complex problems into logical steps"
+    },
+    "few_shot": {
+        "prefix": "Based on similar situations I've encountered:\n\n",
+        "description": "Uses examples to demonstrate problem-solving approach"
+    },
+    "step_by_step": {
+        "prefix": "I'll break this down into clear, actionable steps:\n\n",
+        "description": "Provides structured, sequential guidance"
+    },
+    "socratic": {
+        "prefix": "Let me help you explore this through guided questions:\n\n",
+        "description": "Uses questions to guide thinking and discovery"
+    },
+    "analogical": {
+        "prefix": "Let me explain this using analogies to make it clearer:\n\n", 
+        "description": "Uses comparisons and metaphors for understanding"
+    }
+})
+
+@dataclass(slots=True)
+class Message:
+    """One conversation turn; slots keep long conversations compact"""
+    role: str
+    content: str
+    timestamp: datetime
+    technique: Optional[str] = None
+    processing_time: float = 0.0
+    personality: Optional[str] = None
+
+class ShardedSessionStore(MutableMapping):
+    """In-process session store split into lock-guarded shards, with the OrderedDict API M1ChatbotSystem uses"""
     
-    def _load_prompt_techniques(self):
-        """Load prompt engineering techniques"""
-        return {
-            "chain_of_thought": {
-                "prefix": "Let me think through this systematically, step by step:\n\n",
-                "description": "Breaks down complex problems into logical steps"
-            },
-            "few_shot": {
-                "prefix": "Based on similar situations I've encountered:\n\n",
-                "description": "Uses examples to demonstrate problem-solving approach"
-            },
-            "step_by_step": {
-                "prefix": "I'll break this down into clear, actionable steps:\n\n",
-                "description": "Provides structured, sequential guidance"
-            },
-            "socratic": {
-                "prefix": "Let me help you explore this through guided questions:\n\n",
-                "description": "Uses questions to guide thinking and discovery"
-            },
-            "analogical": {
-                "prefix": "Let me explain this using analogies to make it clearer:\n\n", 
-                "description": "Uses comparisons and metaphors for understanding"
-            }
-        }
+    def __init__(self, shard_count: int = 16):
+        # A power of two, so masking the hash picks the shard
+        self._mask = shard_count - 1
+        self._shards = [OrderedDict() for _ in range(shard_count)]
+        self._locks = [threading.Lock() for _ in range(shard_count)]
+    
+    def _shard(self, session_id):
+        index = hash(session_id) & self._mask
+        return self._shards[index], self._locks[index]
+    
+    def __getitem__(self, session_id: str) -> Dict:
+        shard, lock = self._shard(session_id)
+        with lock:
+            return shard[session_id]
+    
+    def __setitem__(self, session_id: str, session: Dict):
+        shard, lock = self._shard(session_id)
+        with lock:
+            shard[session_id] = session
+    
+    def __delitem__(self, session_id: str):
+        shard, lock = self._shard(session_id)
+        with lock:
+            del shard[session_id]
+    
+    def __contains__(self, session_id) -> bool:
+        shard, lock = self._shard(session_id)
+        with lock:
+            return session_id in shard
+    
+    def __iter__(self):
+        for session_id, _ in self.items():
+            yield session_id
+    
+    def __len__(self) -> int:
+        return sum(len(shard) for shard in self._shards)
+    
+    def items(self):
+        """Snapshot of all sessions, shard by shard"""
+        items = []
+        for shard, lock in zip(self._shards, self._locks):
+            with lock:
+                items.extend(shard.items())
+        return items
+    
+    def pop(self, session_id: str, *default):
+        shard, lock = self._shard(session_id)
+        with lock:
+            return shard.pop(session_id, *default)
+    
+    def move_to_end(self, session_id: str):
+        """Mark the session most recently active within its shard"""
+        shard, lock = self._shard(session_id)
+        with lock:
+            shard.move_to_end(session_id)
+    
+    def oldest(self):
+        """(session_id, session) of the least recently active session across shards, or None when empty"""
+        heads = []
+        for shard, lock in zip(self._shards, self._locks):
+            with lock:
+                if shard:
+                    heads.append(next(iter(shard.items())))
+        return min(heads, key=lambda item: item[1]["last_activity"], default=None)
+    
+    def clear(self):
+        for shard, lock in zip(self._shards, self._locks):
+            with lock:
+                shard.clear()
+
+class M1ChatbotSystem:
+    """Complete M1-optimized chatbot system"""
+    
+    # No per-instance __dict__: the attributes chat() reads on every call are fixed slots
+    __slots__ = (
+        "personalities", "prompt_techniques", "sessions",
+        "_dispatch", "_cached_response", "_log_handles", "_log_lock"
+    )
+    
+    RESPONSE_CACHE_SIZE = 4096
+    MAX_SESSIONS = int(os.getenv("MAX_SESSIONS", "10000"))
+    SESSION_TIMEOUT = timedelta(seconds=int(os.getenv("SESSION_TIMEOUT", "3600")))
+    # Full conversations go to an append-only JSONL log per session; only the latest turns stay in memory
+    SESSION_LOG_DIR = os.getenv("SESSION_LOG_DIR", "session_logs")
+    CONVERSATION_WINDOW = int(os.getenv("CONVERSATION_WINDOW", "20"))
+    MAX_OPEN_LOGS = int(os.getenv("MAX_OPEN_LOGS", "256"))
+    
+    # Used when no keyword matches
+    DEFAULT_RESPONSES = {
+        "technical_expert": "I can help with technical challenges! Share more details about your specific issue - error messages, system specs, or performance metrics would be helpful for me to provide targeted solutions.",
+        "creative_partner": "That sounds like an exciting creative project! What aspect would you like to explore first - character development, plot structure, world-building, or writing techniques?",
+        "business_advisor": "Great business question! To provide strategic advice, could you share more context about your industry, target market, current business stage, and specific challenges you're facing?"
+    }
+    FALLBACK_RESPONSE = "I'd be happy to help! Could you provide more details about what you're looking for?"
+    
+    def __init__(self, sessions=None):
+        self.personalities = PERSONALITIES
+        self.prompt_techniques = PROMPT_TECHNIQUES
+        self._dispatch = self._build_dispatch()
+        # Append handles for recently active session logs, least recently used first
+        self._log_handles = OrderedDict()
+        self._log_lock = threading.Lock()
+        # Ordered least- to most-recently active; chat() moves sessions to the end.
+        # Any mapping with move_to_end() works, e.g. a shared MemcachedSessionStore.
+        self.sessions = sessions if sessions is not None else ShardedSessionStore()
+        if hasattr(self.sessions, "on_expire"):
+            self.sessions.on_expire = self._drop_log  # Sessions a shared store let expire
+        # Responses are deterministic per (personality, normalized message, technique)
+        self._cached_response = lru_cache(maxsize=self.RESPONSE_CACHE_SIZE)(self._generate_response)
+        logger.info("✅ M1 Chatbot System initialized")
     
     def create_session(self, personality="technical_expert"):
         """Create new chat session"""
-        session_id = f"session_{int(time.time())}_{hashlib.md5(str(datetime.now()).encode()).hexdigest()[:8]}"
+        # One clock read serves the id, the creation time and the eviction cutoff
+        created_ns = time.time_ns()
+        created_at = datetime.fromtimestamp(created_ns / 1e9)
+        self._evict_sessions(created_at)
+        
+        session_id = f"session_{created_ns}_{secrets.token_hex(4)}"
         
         self.sessions[session_id] = {
             "personality": personality,
-            "created_at": datetime.now(),
-            "conversation": [],
+            "created_at": created_at,
+            "last_activity": created_at,
+            "conversation": deque(maxlen=self.CONVERSATION_WINDOW),
             "stats": {
                 "total_messages": 0,
-                "total_processing_time": 0.0
+                "user_messages": 0,
+                "assistant_messages": 0,
+                "techniques": Counter(),
+                "total_processing_time_ns": 0,
+                # Per-turn processing times in seconds; the first assistant_messages entries are filled
+                "processing_times": np.empty(64, dtype=np.float32)
             }
         }
         
-        print(f"📝 Created session {session_id} with {personality} personality")
+        logger.debug("📝 Created session %s with %s personality", session_id, personality)
         return session_id
     
+    def _evict_sessions(self, now: Optional[datetime] = None):
+        """Drop expired sessions, then the least recently active ones over MAX_SESSIONS"""
+        cutoff = (now or datetime.now()) - self.SESSION_TIMEOUT
+        while (oldest := self._oldest_session()) is not None:
+            session_id, session = oldest
+            if session["last_activity"] > cutoff and len(self.sessions) < self.MAX_SESSIONS:
+                break
+            self.sessions.pop(session_id, None)
+            self._drop_log(session_id)
+    
+    def _oldest_session(self):
+        """Least recently active (session_id, session), or None when there are no sessions"""
+        # Sharded stores have no single global order, so they find it themselves
+        oldest = getattr(self.sessions, "oldest", None)
+        if oldest is not None:
+            return oldest()
+        return next(iter(self.sessions.items()), None)
+    
+    def _build_dispatch(self):
+        """Per personality: a keyword pattern and, per technique, the prefixed responses indexed by keyword id"""
+        dispatch = {}
+        for personality, data in self.personalities.items():
+            # One alternation inside a lookahead reports a keyword at every position in a single pass;
+            # each keyword is its own group, so match.lastindex is its id (1-based, with 0 for the
+            # default response) and the lowest id found keeps the table's keyword priority
+            pattern = re.compile(
+                b"(?=" + b"|".join(b"(" + re.escape(keyword.encode()) + b")" for keyword in data["responses"]) + b")"
+            )
+            bodies = (self.DEFAULT_RESPONSES.get(personality, self.FALLBACK_RESPONSE), *data["responses"].values())
+            rows = {
+                technique: tuple(
+                    (self.prompt_techniques[technique]["prefix"] if technique in self.prompt_techniques else "") + body
+                    for body in bodies
+                )
+                for technique in ("standard", *self.prompt_techniques)
+            }
+            dispatch[personality] = (pattern, rows)
+        return dispatch
+    
+    def _respond(self, personality, user_message, technique):
+        """Response text for a message; repeats that differ only in ASCII case or surrounding whitespace hit the cache"""
+        normalized = user_message.encode("utf-8", "ignore").translate(ASCII_LOWER).strip()
+        return self._cached_response(personality, normalized, technique)
+    
+    def _generate_response(self, personality, normalized_message, technique):
+        """Look up the response text for a personality and technique"""
+        pattern, rows = self._dispatch[personality]
+        
+        # Find relevant response based on keywords; unknown techniques get the unprefixed response
+        keyword_id = min((match.lastindex for match in pattern.finditer(normalized_message)), default=0)
+        row = rows.get(technique) or rows["standard"]
+        return row[keyword_id]
+    
     def chat(self, session_id, user_message, technique="standard"):
         """Main chat function with advanced prompt engineering"""
         if session_id not in self.sessions:
             raise ValueError(f"Session {session_id} not found")
         
         session = self.sessions[session_id]
-        start_time = time.time()
+        start_ns = time.perf_counter_ns()
         
-        # Get personality responses
         personality = session["personality"]
-        personality_data = self.personalities[personality]
-        responses = personality_data["responses"]
+        response = self._respond(personality, user_message, technique)
         
-        # Apply prompt engineering technique
-        technique_data = self.prompt_techniques.get(technique, {"prefix": "", "description": "Standard response"})
-        prefix = technique_data["prefix"]
-        
-        # Find relevant response based on keywords
-        user_message_lower = user_message.lower()
-        response = None
-        
-        for keyword, template_response in responses.items():
-            if keyword in user_message_lower:
-                response = prefix + template_response
-                break
-        
-        # Default response if no keyword match
-        if not response:
-            defaults = {
-                "technical_expert": "I can help with technical challenges! Share more details about your specific issue - error messages, system specs, or performance metrics would be helpful for me to provide targeted solutions.",
-                "creative_partner": "That sounds like an exciting creative project! What aspect would you like to explore first - character development, plot structure, world-building, or writing techniques?",
-                "business_advisor": "Great business question! To provide strategic advice, could you share more context about your industry, target market, current business stage, and specific challenges you're facing?"
-            }
-            response = prefix + defaults.get(personality, "I'd be happy to help! Could you provide more details about what you're looking for?")
-        
-        processing_time = time.time() - start_time
+        # Monotonic integer nanoseconds; the session total accumulates without float error
+        processing_time_ns = time.perf_counter_ns() - start_ns
+        processing_time = processing_time_ns / 1e9
+        now = datetime.now()
         
         # Add to conversation
-        session["conversation"].extend([
-            {
-                "role": "user",
-                "content": user_message,
-                "timestamp": datetime.now().isoformat(),
-                "technique": technique
-            },
-            {
-                "role": "assistant",
-                "content": response,
-                "timestamp": datetime.now().isoformat(),
-                "processing_time": processing_time,
-                "personality": personality
-            }
-        ])
+        conversation = session["conversation"]
+        turn = (
+            self._append_message(conversation, "user", user_message, now, technique=technique),
+            self._append_message(
+                conversation, "assistant", response, now, processing_time=processing_time, personality=personality
+            )
+        )
+        self._write_log(session_id, b"".join(orjson.dumps(message, option=orjson.OPT_APPEND_NEWLINE) for message in turn))
         
         # Update stats
-        session["stats"]["total_messages"] += 2
-        session["stats"]["total_processing_time"] += processing_time
+        session["last_activity"] = now
+        stats = session["stats"]
+        turn_index = stats["assistant_messages"]
+        if turn_index == len(stats["processing_times"]):
+            stats["processing_times"] = np.resize(stats["processing_times"], 2 * turn_index)
+        stats["processing_times"][turn_index] = processing_time
+        stats["total_messages"] += 2
+        stats["user_messages"] += 1
+        stats["assistant_messages"] += 1
+        stats["techniques"][technique] += 1
+        stats["total_processing_time_ns"] += processing_time_ns
+        # Write back for external stores; this is read-modify-write, so concurrent turns on one
+        # session in different workers keep only the last write
+        self.sessions[session_id] = session
+        self.sessions.move_to_end(session_id)
         
         return {
             "response": response,
@@ -399,40 +583,151 @@ What's your primary strategic challenge? Are you looking to scale existing busin
             "session_id": session_id
         }
     
+    def chat_bytes(self, session_id, user_message, technique="standard", **extra) -> bytes:
+        """chat() result, plus any extra fields, encoded as JSON bytes ready to send"""
+        return orjson.dumps({**self.chat(session_id, user_message, technique), **extra})
+    
+    def chat_stream(self, session_id, user_message, technique="standard"):
+        """Chat, yielding the response one paragraph at a time"""
+        result = self.chat(session_id, user_message, technique)
+        paragraphs = result["response"].split("\n\n")
+        
+        for paragraph in paragraphs[:-1]:
+            yield paragraph + "\n\n"
+        yield paragraphs[-1]
+    
+    def chat_stateless(self, personality, user_message, technique="standard"):
+        """One-off chat that neither creates nor records a session"""
+        if personality not in self.personalities:
+            raise ValueError(f"Unknown personality {personality}")
+        
+        start_ns = time.perf_counter_ns()
+        response = self._respond(personality, user_message, technique)
+        
+        return {
+            "response": response,
+            "processing_time": (time.perf_counter_ns() - start_ns) / 1e9,
+            "technique": technique,
+            "personality": personality
+        }
+    
+    @staticmethod
+    def _append_message(conversation, role, content, timestamp, technique=None, processing_time=0.0, personality=None):
+        """Append a message, reusing the one a full window is about to drop instead of allocating"""
+        # A window under two would hand back the turn's own user message (or pop an empty deque)
+        if conversation.maxlen is not None and conversation.maxlen >= 2 and len(conversation) == conversation.maxlen:
+            message = conversation.popleft()
+            message.role = role
+            message.content = content
+            message.timestamp = timestamp
+            message.technique = technique
+            message.processing_time = processing_time
+            message.personality = personality
+        else:
+            message = Message(role, content, timestamp, technique, processing_time, personality)
+        conversation.append(message)
+        return message
+    
+    def _log_path(self, session_id):
+        """Conversation log file for a session"""
+        return os.path.join(self.SESSION_LOG_DIR, f"{session_id}.jsonl")
+    
+    def _write_log(self, session_id, data: bytes):
+        """Append to a session log through a kept-open handle"""
+        with self._log_lock:
+            log = self._log_handles.get(session_id)
+            if log is None:
+                os.makedirs(self.SESSION_LOG_DIR, exist_ok=True)
+                # Unbuffered: each turn is one append, visible to load_conversation immediately
+                log = self._log_handles[session_id] = open(self._log_path(session_id), "ab", buffering=0)
+                if len(self._log_handles) > self.MAX_OPEN_LOGS:
+                    self._log_handles.popitem(last=False)[1].close()
+            else:
+                self._log_handles.move_to_end(session_id)
+            log.write(data)
+    
+    def _drop_log(self, session_id):
+        """Close and delete a session log"""
+        with self._log_lock:
+            log = self._log_handles.pop(session_id, None)
+        if log is not None:
+            log.close()
+        try:
+            os.remove(self._log_path(session_id))
+        except FileNotFoundError:
+            pass
+    
+    def delete_session(self, session_id) -> bool:
+        """Remove a session and its log; False if it did not exist"""
+        found = self.sessions.pop(session_id, None) is not None
+        self._drop_log(session_id)
+        return found
+    
+    def clear_sessions(self) -> int:
+        """Remove every session and log, returning how many sessions there were"""
+        session_count = len(self.sessions)
+        self.sessions.clear()
+        with self._log_lock:
+            handles = list(self._log_handles.values())
+            self._log_handles.clear()
+        for log in handles:
+            log.close()
+        try:
+            entries = list(os.scandir(self.SESSION_LOG_DIR))
+        except FileNotFoundError:
+            entries = []
+        for entry in entries:
+            if entry.name.endswith(".jsonl"):
+                try:
+                    os.remove(entry.path)
+                except FileNotFoundError:
+                    pass
+        return session_count
+    
+    def load_conversation(self, session_id) -> List[Dict]:
+        """Full conversation read back from the session log"""
+        try:
+            with open(self._log_path(session_id), "rb") as log, \
+                    mmap.mmap(log.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+                return [orjson.loads(line) for line in iter(buf.readline, b"")]
+        except (FileNotFoundError, ValueError):  # No turns yet; an empty file cannot be mapped
+            return []
+    
     def get_session_analysis(self, session_id):
         """Get comprehensive session analysis"""
         if session_id not in self.sessions:
             raise ValueError(f"Session {session_id} not found")
         
         session = self.sessions[session_id]
-        conversation = session["conversation"]
-        
-        user_messages = [msg for msg in conversation if msg["role"] == "user"]
-        assistant_messages = [msg for msg in conversation if msg["role"] == "assistant"]
-        
-        # Analyze techniques used
-        techniques_used = {}
-        for msg in user_messages:
-            technique = msg.get("technique", "standard")
-            techniques_used[technique] = techniques_used.get(technique, 0) + 1
+        # Counters are kept up to date by chat(), so no pass over the conversation is needed
+        stats = session["stats"]
+        assistant_messages = stats["assistant_messages"]
+        total_processing_time = stats["total_processing_time_ns"] / 1e9
         
         return {
             "session_id": session_id,
             "personality": session["personality"],
-            "created_at": session["created_at"].isoformat(),
+            "created_at": session["created_at"],
             "conversation_stats": {
-                "total_messages": len(conversation),
-                "user_messages": len(user_messages),
-                "assistant_messages": len(assistant_messages),
-                "total_processing_time": session["stats"]["total_processing_time"],
-                "avg_processing_time": session["stats"]["total_processing_time"] / len(assistant_messages) if assistant_messages else 0
+                "total_messages": stats["total_messages"],
+                "user_messages": stats["user_messages"],
+                "assistant_messages": assistant_messages,
+                "total_processing_time": total_processing_time,
+                "avg_processing_time": total_processing_time / assistant_messages if assistant_messages else 0,
+                "p95_processing_time": (
+                    float(np.percentile(stats["processing_times"][:assistant_messages], 95)) if assistant_messages else 0
+                )
             },
             "prompt_engineering": {
-                "techniques_used": list(techniques_used.keys()),
-                "technique_frequency": techniques_used
+                "techniques_used": list(stats["techniques"]),
+                "technique_frequency": dict(stats["techniques"])
             },
-            "export_timestamp": datetime.now().isoformat()
+            "export_timestamp": datetime.now()
         }
+    
+    def to_json(self, session_id) -> bytes:
+        """Session analysis encoded as JSON bytes; datetimes are serialized by orjson"""
+        return orjson.dumps(self.get_session_analysis(session_id), option=orjson.OPT_SERIALIZE_NUMPY)
 
 def run_comprehensive_demo():
     """Run comprehensive demo showcasing all features"""
@@ -510,6 +805,8 @@ def run_comprehensive_demo():
     return chatbot_system
 
 if __name__ == "__main__":
+    print("🚀 M1 OPTIMIZED CHATBOT SYSTEM - DAY 3")
+    print("=" * 60)
     try:
         system = run_comprehensive_demo()
         print("\n🌟 SUCCESS: M1 Chatbot System fully operational!")